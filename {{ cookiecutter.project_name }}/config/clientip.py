@@ -0,0 +1,37 @@
+"""
+The address of the client that made a request. Behind a reverse proxy
+REMOTE_ADDR is the proxy's, and the client's is in a header the proxy
+adds (CLIENT_IP_HEADER, X-Forwarded-For by default). Anyone can send that
+header, so it is only read when REMOTE_ADDR is in TRUSTED_PROXIES, and
+then from the right: each proxy appends the address it got the request
+from, so the first address that isn't a trusted proxy is the client.
+"""
+import ipaddress
+from functools import lru_cache
+
+from django.conf import settings
+
+
+@lru_cache(maxsize=8)
+def trusted_networks(proxies):
+    return tuple(ipaddress.ip_network(proxy.strip(), strict=False) for proxy in proxies if proxy.strip())
+
+
+def is_trusted_proxy(address):
+    networks = trusted_networks(tuple(settings.TRUSTED_PROXIES))
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def client_ip(request):
+    address = request.META.get("REMOTE_ADDR", "")
+    if not settings.CLIENT_IP_HEADER or not is_trusted_proxy(address):
+        return address
+    header = "HTTP_" + settings.CLIENT_IP_HEADER.upper().replace("-", "_")
+    hops = [hop.strip() for hop in request.META.get(header, "").split(",") if hop.strip()]
+    while hops and is_trusted_proxy(address):
+        address = hops.pop()
+    return address
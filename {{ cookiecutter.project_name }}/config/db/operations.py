@@ -0,0 +1,118 @@
+"""
+Migration operations that leave a busy table readable and writable while
+they run. Each one cannot run in a transaction, so migrations using them
+need atomic = False. `manage.py lint_migrations` suggests them in place of
+Django's blocking operations.
+
+Adding a NOT NULL column with a default is already safe: PostgreSQL 11+
+stores the default instead of rewriting the table. To make an existing
+nullable column NOT NULL, backfill it (see `manage.py backfill`) and then
+use SetNotNull.
+"""
+from contextlib import contextmanager
+
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently as BaseAddIndexConcurrently, NotInTransactionMixin, RemoveIndexConcurrently,
+)
+from django.db.migrations.operations import AlterField
+
+__all__ = ['AddIndexConcurrently', 'RemoveIndexConcurrently', 'SetNotNull']
+
+# How long DDL may wait for its lock. Waiting longer would hold up every
+# query queued behind it; it's better to fail and run the migration again.
+LOCK_TIMEOUT = "5s"
+
+
+@contextmanager
+def lock_timeout(schema_editor, timeout):
+    schema_editor.execute("SET lock_timeout = %s", [timeout])
+    try:
+        yield
+    finally:
+        schema_editor.execute("RESET lock_timeout")
+
+
+class AddIndexConcurrently(BaseAddIndexConcurrently):
+    """
+    Like Django's, but first drops an invalid index of the same name, which
+    a failed CREATE INDEX CONCURRENTLY leaves behind, so the migration can
+    simply be run again.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            name = schema_editor.quote_name(self.index.name)
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND NOT indisvalid", [name],
+                )
+                invalid = cursor.fetchone()
+            if invalid:
+                schema_editor.execute("DROP INDEX CONCURRENTLY IF EXISTS %s" % name)
+        super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+
+class SetNotNull(NotInTransactionMixin, AlterField):
+    """
+    An AlterField that only sets null=False. Instead of one SET NOT NULL,
+    which scans the table while holding a lock that blocks reads and writes,
+    it adds a NOT VALID check constraint, validates it while reads and
+    writes go on, and then sets NOT NULL, which PostgreSQL 12+ proves from
+    the constraint without a scan.
+    """
+
+    atomic = False
+
+    def __init__(self, model_name, name, field, lock_timeout=LOCK_TIMEOUT):
+        self.lock_timeout = lock_timeout
+        super().__init__(model_name, name, field)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        if self.lock_timeout != LOCK_TIMEOUT:
+            kwargs['lock_timeout'] = self.lock_timeout
+        return name, args, kwargs
+
+    def describe(self):
+        return "Set %s.%s NOT NULL without a long lock" % (self.model_name, self.name)
+
+    @property
+    def migration_name_fragment(self):
+        return '%s_%s_not_null' % (self.model_name_lower, self.name_lower)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._ensure_not_in_transaction(schema_editor)
+        to_model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, to_model):
+            return
+        from_field = from_state.apps.get_model(app_label, self.model_name)._meta.get_field(self.name)
+        to_field = to_model._meta.get_field(self.name)
+        connection = schema_editor.connection
+        if to_field.null or from_field.db_parameters(connection) != to_field.db_parameters(connection):
+            raise ValueError("SetNotNull can only change null to False; use AlterField for anything else.")
+
+        table = to_model._meta.db_table
+        constraint = schema_editor.quote_name(
+            schema_editor._create_index_name(table, [to_field.column], suffix='_notnull'),
+        )
+        table, column = schema_editor.quote_name(table), schema_editor.quote_name(to_field.column)
+        with lock_timeout(schema_editor, self.lock_timeout):
+            # Left over if an earlier attempt failed.
+            schema_editor.execute("ALTER TABLE %s DROP CONSTRAINT IF EXISTS %s" % (table, constraint))
+            schema_editor.execute("ALTER TABLE %s ADD CONSTRAINT %s CHECK (%s IS NOT NULL) NOT VALID" % (
+                table, constraint, column,
+            ))
+        schema_editor.execute("ALTER TABLE %s VALIDATE CONSTRAINT %s" % (table, constraint))
+        with lock_timeout(schema_editor, self.lock_timeout):
+            schema_editor.execute("ALTER TABLE %s ALTER COLUMN %s SET NOT NULL" % (table, column))
+            schema_editor.execute("ALTER TABLE %s DROP CONSTRAINT %s" % (table, constraint))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.execute("ALTER TABLE %s ALTER COLUMN %s DROP NOT NULL" % (
+                schema_editor.quote_name(model._meta.db_table),
+                schema_editor.quote_name(model._meta.get_field(self.name).column),
+            ))
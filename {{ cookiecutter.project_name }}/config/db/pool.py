@@ -0,0 +1,171 @@
+"""
+A small, thread-safe connection pool. One pool exists per database and
+process; see config/db/postgresql/base.py for how Django uses it.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, max_size, timeout=10.0, max_lifetime=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self._idle = deque()
+        self._in_use = 0
+        self._waiting = 0
+        self._created = {}
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+        }
+
+    def acquire(self, connect, check=None):
+        """
+        Return an idle connection, or open a new one with connect() if the
+        pool has room. Blocks for up to self.timeout seconds when the pool
+        is exhausted. check(conn) may return False to reject a stale idle
+        connection, in which case it is replaced.
+        """
+        self._reset_after_fork()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._idle and self._in_use >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            "No database connection available within %ss "
+                            "(pool size %s)." % (self.timeout, self.max_size)
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            waited = time.monotonic() - start
+            self._stats["waits"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+            conn = self._idle.pop() if self._idle else None
+            self._in_use += 1
+
+        # Connecting and health checks happen outside the lock; the slot
+        # reserved above keeps the pool bounded meanwhile.
+        try:
+            if conn is not None and (self._expired(conn) or (check and not check(conn))):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = connect()
+                with self._cond:
+                    self._created[id(conn)] = time.monotonic()
+                    self._stats["connections_created"] += 1
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """ Hand a connection back, closing it if it is broken or too old. """
+        if discard or self._expired(conn):
+            self._discard(conn)
+        else:
+            with self._cond:
+                self._idle.append(conn)
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def close_idle(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+            })
+        return stats
+
+    def _expired(self, conn):
+        if getattr(conn, "closed", False):
+            return True
+        if self.max_lifetime is None:
+            return False
+        created = self._created.get(id(conn))
+        return created is not None and time.monotonic() - created >= self.max_lifetime
+
+    def _discard(self, conn):
+        with self._cond:
+            self._created.pop(id(conn), None)
+            self._stats["connections_closed"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _reset_after_fork(self):
+        """
+        Connections opened before a fork belong to the parent. Forget them
+        without closing, since closing would also close the parent's socket.
+        """
+        if self._pid != os.getpid():
+            with self._cond:
+                if self._pid != os.getpid():
+                    self._idle.clear()
+                    self._created.clear()
+                    self._in_use = 0
+                    self._pid = os.getpid()
+
+
+def get_pool(alias, conn_params, **options):
+    key = (alias, conn_params.get("database"), tuple(sorted(
+        (name, str(value)) for name, value in conn_params.items()
+    )))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**options)
+        return _pools[key]
+
+
+def close_idle_connections(database):
+    """ Close idle pooled connections to a database, e.g. before dropping it. """
+    with _pools_lock:
+        pools = [pool for (_, name, _), pool in _pools.items() if name == database]
+    for pool in pools:
+        pool.close_idle()
+
+
+def get_pool_stats():
+    """ Pool statistics of this process, keyed by "<alias>/<database>". """
+    with _pools_lock:
+        pools = dict(_pools)
+    return {
+        "%s/%s" % (alias, database): pool.stats()
+        for (alias, database, _), pool in pools.items()
+    }
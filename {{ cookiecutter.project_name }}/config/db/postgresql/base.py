@@ -0,0 +1,108 @@
+"""
+PostgreSQL backend with health checks and an optional per-process pool.
+
+Extra keys read from the DATABASES entry:
+
+    HEALTH_CHECKS   Check a reused connection with a cheap query before the
+                    first use in each request, and reconnect if it is dead.
+    POOL            {'MAX_SIZE': int, 'TIMEOUT': seconds, 'MAX_LIFETIME': seconds}
+                    With MAX_SIZE > 0, closing a connection hands it back to
+                    a bounded pool shared by the threads of the process.
+"""
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from ..pool import close_idle_connections, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would block DROP DATABASE.
+        close_idle_connections(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    health_check_done = False
+    pool = None
+
+    @property
+    def health_checks_enabled(self):
+        return self.settings_dict.get('HEALTH_CHECKS', False)
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('MAX_SIZE'):
+            self.pool = None
+            return super().get_new_connection(conn_params)
+
+        # Pools are keyed by connection parameters as well as alias, since
+        # e.g. the test runner points an alias at another database.
+        self.pool = get_pool(
+            self.alias,
+            conn_params,
+            max_size=options['MAX_SIZE'],
+            timeout=options.get('TIMEOUT', 10.0),
+            max_lifetime=options.get('MAX_LIFETIME'),
+        )
+        connection = self.pool.acquire(
+            connect=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+            check=self._is_connection_usable if self.health_checks_enabled else None,
+        )
+        # A reused connection skipped get_new_connection(), which is where
+        # isolation_level gets set.
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level,
+        )
+        return connection
+
+    def connect(self):
+        # Fresh or just checked out of the pool, no need to check it again.
+        # Set first, since connect() itself goes through ensure_connection().
+        self.health_check_done = True
+        super().connect()
+
+    def _close(self):
+        if self.pool is None:
+            return super()._close()
+
+        connection = self.connection
+        status = connection.get_transaction_status()
+        discard = status == extensions.TRANSACTION_STATUS_UNKNOWN
+        if status not in (extensions.TRANSACTION_STATUS_IDLE, extensions.TRANSACTION_STATUS_UNKNOWN):
+            try:
+                connection.rollback()
+            except base.Database.Error:
+                discard = True
+        if not discard and connection.autocommit != self.settings_dict['AUTOCOMMIT']:
+            connection.autocommit = self.settings_dict['AUTOCOMMIT']
+        self.pool.release(connection, discard=discard)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Called at the start and end of every request.
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.health_checks_enabled
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+    @staticmethod
+    def _is_connection_usable(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except base.Database.Error:
+            return False
+        return True
@@ -0,0 +1,108 @@
+"""
+Primary/replica routing with read-your-writes.
+
+Writes go to the primary ('default'); reads go to a random alias from
+DATABASE_REPLICAS. Once a request writes, the rest of it reads from the
+primary, and ReplicaStickinessMiddleware sets a cookie that keeps the
+client's next requests on the primary for REPLICA_STICKY_SECONDS, long
+enough for the replicas to catch up. Outside requests (management
+commands) a write pins the thread to the primary from then on.
+"""
+import asyncio
+import random
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'db_primary'
+
+_state = Local()
+
+
+def record_write():
+    _state.pinned = True
+    _state.wrote = True
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def has_written():
+    return getattr(_state, 'wrote', False)
+
+
+def reset(pinned=False):
+    _state.pinned = pinned
+    _state.wrote = False
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or is_pinned():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        record_write()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """ Put this before SessionMiddleware, so that session reads stick too. """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks this instance as async, like Django's MiddlewareMixin.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        reset(pinned=STICKY_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+            wrote = has_written()
+        finally:
+            reset()
+        return self.stick(response, wrote)
+
+    async def __acall__(self, request):
+        # _state is an asgiref Local, so the request's sync_to_async
+        # threads see it too.
+        reset(pinned=STICKY_COOKIE in request.COOKIES)
+        try:
+            response = await self.get_response(request)
+            wrote = has_written()
+        finally:
+            reset()
+        return self.stick(response, wrote)
+
+    def stick(self, response, wrote):
+        if wrote:
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,195 @@
+"""
+Structured logging. RequestLogMiddleware gives each request an ID, taken
+from a well-formed X-Request-ID header so that a proxy's ID carries
+through, returns it in X-Request-ID and logs one line per request to
+"config.requests". While the request runs, SQL slower than SLOW_QUERY_MS
+is logged to "config.slow_queries" with its EXPLAIN plan and the view.
+RequestIDFilter adds the ID to everything else logged meanwhile, and
+JsonFormatter writes each record as one JSON object.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections, transaction
+
+from .clientip import client_ip
+from .metrics import wrap_execute
+
+request_logger = logging.getLogger("config.requests")
+slow_query_logger = logging.getLogger("config.slow_queries")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]+")
+MAX_REQUEST_ID_LENGTH = 64
+# EXPLAIN without ANALYZE only plans these; it never runs them.
+EXPLAINABLE = ("select", "insert", "update", "delete", "with")
+
+_state = Local()
+
+
+def get_request_id():
+    return getattr(_state, "request_id", None)
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else None
+
+
+class SlowQueryLogger:
+    """ Execute wrapper that logs queries taking threshold_ms or longer. """
+
+    def __init__(self, request, threshold_ms):
+        self.request = request
+        self.threshold_ms = threshold_ms
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = 1000 * (time.perf_counter() - start)
+        if duration_ms >= self.threshold_ms:
+            connection = context["connection"]
+            slow_query_logger.warning(
+                "Slow query: %.1f ms in %s", duration_ms, view_name(self.request),
+                extra={
+                    "duration_ms": round(duration_ms, 1),
+                    "view": view_name(self.request),
+                    "database": connection.alias,
+                    "sql": sql,
+                    "plan": None if many else self.explain(connection, sql, params),
+                },
+            )
+        return result
+
+    def explain(self, connection, sql, params):
+        if not sql.lstrip().lower().startswith(EXPLAINABLE):
+            return None
+        self.explaining = True
+        try:
+            # In a savepoint, so a failed EXPLAIN can't break the request's
+            # transaction.
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute("EXPLAIN " + sql, params)
+                return "\n".join(row[0] for row in cursor.fetchall())
+        except DatabaseError as error:
+            return "EXPLAIN failed: %s" % error
+        finally:
+            self.explaining = False
+
+
+class RequestLogMiddleware:
+    """
+    Put this right after TimingMiddleware, whose database and template
+    times it logs.
+    """
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks this instance as async, like Django's MiddlewareMixin.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        start = self.start(request)
+        with ExitStack() as stack:
+            if settings.SLOW_QUERY_MS:
+                wrapper = SlowQueryLogger(request, settings.SLOW_QUERY_MS)
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(wrapper))
+            response = self.get_response(request)
+        return self.log(request, response, start)
+
+    async def __acall__(self, request):
+        start = self.start(request)
+        if settings.SLOW_QUERY_MS:
+            wrapper = SlowQueryLogger(request, settings.SLOW_QUERY_MS)
+            response = await wrap_execute(wrapper, self.get_response, request)
+        else:
+            response = await self.get_response(request)
+        return self.log(request, response, start)
+
+    def start(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, "")
+        if len(request_id) > MAX_REQUEST_ID_LENGTH or not VALID_REQUEST_ID.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        request.id = _state.request_id = request_id
+        return time.perf_counter()
+
+    def log(self, request, response, start):
+        request_id = request.id
+        duration_ms = 1000 * (time.perf_counter() - start)
+
+        response[REQUEST_ID_HEADER] = request_id
+        entry = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 1),
+            "view": view_name(request),
+            "remote_addr": client_ip(request),
+        }
+        timer = getattr(request, "_timer", None)
+        if timer is not None:
+            entry.update(
+                db_ms=round(1000 * timer.db, 1),
+                queries=timer.queries,
+                template_ms=round(1000 * timer.template, 1),
+            )
+        request_logger.info(
+            "%s %s %s %.1f ms", request.method, request.path, response.status_code, duration_ms,
+            extra=entry,
+        )
+        return response
+
+
+def clear_request_id(**kwargs):
+    """ Connected to request_finished, which is sent after Django has
+    logged the response, so that log line still gets the ID. """
+    _state.request_id = None
+
+
+request_finished.connect(clear_request_id)
+
+
+class RequestIDFilter(logging.Filter):
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = get_request_id()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per record, with anything passed in extra=. """
+
+    # Attributes every record has; the rest came from extra=.
+    STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.STANDARD:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
@@ -0,0 +1,217 @@
+"""
+Per-view request latency. TimingMiddleware records how long each request
+took, split into database and template time, keyed by URL name (e.g.
+"user:detail"). Every response gets a Server-Timing header, and
+metrics_view exposes the histograms in the Prometheus text format.
+
+Numbers are kept per process, like the connection pool stats, so scrape
+every worker (or run one per container).
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+from .clientip import client_ip
+from .db.pool import get_pool_stats
+
+# Upper bounds in seconds; the last bucket is +Inf.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class ViewStats:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.db = 0.0
+        self.queries = 0
+        self.template = 0.0
+
+    def observe(self, duration, db, queries, template):
+        self.buckets[bisect_left(BUCKETS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.db += db
+        self.queries += queries
+        self.template += template
+
+
+class Registry:
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, method, duration, db, queries, template):
+        with self._lock:
+            stats = self._views.get((view, method))
+            if stats is None:
+                stats = self._views[(view, method)] = ViewStats()
+            stats.observe(duration, db, queries, template)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: vars(stats).copy() for key, stats in self._views.items()}
+
+
+registry = Registry()
+
+
+class RequestTimer:
+    """ Time spent in the database and in templates during one request. """
+
+    def __init__(self):
+        self.db = 0.0
+        self.queries = 0
+        self.template = 0.0
+        self.template_start = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+
+def add_execute_wrapper(wrapper):
+    for connection in connections.all():
+        connection.execute_wrappers.append(wrapper)
+
+
+def remove_execute_wrapper(wrapper):
+    for connection in connections.all():
+        if wrapper in connection.execute_wrappers:
+            connection.execute_wrappers.remove(wrapper)
+
+
+async def wrap_execute(wrapper, get_response, request):
+    """ Run the async get_response with wrapper around every query. Queries
+    run on the request's sync_to_async thread, whose connections are not
+    this thread's, so the wrapper is added there. """
+    await sync_to_async(add_execute_wrapper)(wrapper)
+    try:
+        return await get_response(request)
+    finally:
+        await sync_to_async(remove_execute_wrapper)(wrapper)
+
+
+class TimingMiddleware:
+    """
+    Put this right after SecurityMiddleware (and StaticFilesMiddleware) so
+    the timings cover the rest of the stack.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks this instance as async, like Django's MiddlewareMixin.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timer = request._timer = RequestTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        return self.record(request, response, timer, start)
+
+    async def __acall__(self, request):
+        timer = request._timer = RequestTimer()
+        start = time.perf_counter()
+        response = await wrap_execute(timer, self.get_response, request)
+        return self.record(request, response, timer, start)
+
+    def record(self, request, response, timer, start):
+        duration = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match is not None else "<unresolved>"
+        registry.observe(view, request.method, duration, timer.db, timer.queries, timer.template)
+        response["Server-Timing"] = (
+            'db;dur=%.1f;desc="%s queries", tpl;dur=%.1f, total;dur=%.1f'
+            % (1000 * timer.db, timer.queries, 1000 * timer.template, 1000 * duration)
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        timer = request._timer
+        timer.template_start = time.perf_counter()
+
+        def stop(response):
+            timer.template += time.perf_counter() - timer.template_start
+
+        response.add_post_render_callback(stop)
+        return response
+
+
+def metrics_view(request):
+    """ Prometheus text exposition, for clients in METRICS_ALLOWED_IPS. """
+    if client_ip(request) not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def render_metrics():
+    views = sorted(registry.snapshot().items())
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append("# HELP %s %s" % (name, help_text))
+        lines.append("# TYPE %s %s" % (name, kind))
+
+    family("django_request_duration_seconds", "histogram", "Request latency by URL name.")
+    for (view, method), stats in views:
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), stats["buckets"]):
+            cumulative += count
+            lines.append(sample("django_request_duration_seconds_bucket", cumulative, view=view, method=method, le=bound))
+        lines.append(sample("django_request_duration_seconds_sum", stats["total"], view=view, method=method))
+        lines.append(sample("django_request_duration_seconds_count", stats["count"], view=view, method=method))
+
+    for name, key, help_text in (
+        ("django_request_db_seconds_total", "db", "Time spent in database queries."),
+        ("django_request_db_queries_total", "queries", "Database queries run."),
+        ("django_request_template_seconds_total", "template", "Time spent rendering templates."),
+    ):
+        family(name, "counter", help_text)
+        for (view, method), stats in views:
+            lines.append(sample(name, stats[key], view=view, method=method))
+
+    pools = sorted(get_pool_stats().items())
+    if pools:
+        family("django_db_pool_connections", "gauge", "Pooled connections by state.")
+        for pool, stats in pools:
+            for state in ("in_use", "idle", "waiting"):
+                lines.append(sample("django_db_pool_connections", stats[state], pool=pool, state=state))
+        for name, key, help_text in (
+            ("django_db_pool_waits_total", "waits", "Acquires that had to wait."),
+            ("django_db_pool_wait_seconds_total", "wait_time_total", "Time spent waiting for a connection."),
+            ("django_db_pool_timeouts_total", "timeouts", "Acquires that timed out."),
+        ):
+            family(name, "counter", help_text)
+            for pool, stats in pools:
+                lines.append(sample(name, stats[key], pool=pool))
+
+    return "\n".join(lines) + "\n"
+
+
+def sample(name, value, **labels):
+    """ One line of the exposition format: name{label="value",...} value """
+    pairs = ",".join('%s="%s"' % (key, escape(str(label))) for key, label in labels.items())
+    return name + "{" + pairs + "} " + str(value)
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
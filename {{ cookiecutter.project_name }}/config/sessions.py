@@ -0,0 +1,72 @@
+"""
+Cached sessions with write-behind to the database. Use as SESSION_ENGINE.
+
+Reads come from the cache like Django's cached_db engine, but a modified
+session is only written to the database when it is created, when the
+logged in user changes, or when it was last written more than
+SESSION_DB_WRITE_INTERVAL seconds ago. The database copy is what survives
+a cache flush or eviction, so it can be up to one interval behind, but
+never on who is logged in.
+"""
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.base import UpdateError
+
+AUTH_KEYS = (SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY)
+
+
+def auth_state(session):
+    return tuple(session.get(key) for key in AUTH_KEYS)
+
+
+class SessionStore(cached_db.SessionStore):
+    # The login the database copy holds. Logins are always written
+    # through, so a loaded session's login is in the database too.
+    _stored_auth = auth_state({})
+
+    @property
+    def written_key(self):
+        return self.cache_key + ':written'
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        auth = auth_state(self._get_session(no_load=must_create))
+        # Check must_create and the login first: _start_interval() uses up
+        # the interval's write, which a create would otherwise take.
+        if must_create or auth != self._stored_auth or self._start_interval():
+            self._save_to_db(must_create)
+            self._stored_auth = auth
+        else:
+            self._cache.set(self.cache_key, self._get_session(), self.get_expiry_age())
+
+    def load(self):
+        data = super().load()
+        self._stored_auth = auth_state(data)
+        return data
+
+    def _save_to_db(self, must_create):
+        try:
+            super().save(must_create)
+        except UpdateError:
+            # The row may have been purged after its (stale) expire_date while
+            # the cache kept the session alive. A session deleted on purpose,
+            # e.g. by logging out elsewhere, is gone from the cache as well.
+            if self._cache.get(self.cache_key) is None:
+                raise
+            super().save(must_create=True)
+
+    def _start_interval(self):
+        """ Return True if the database copy is due for a write. """
+        interval = settings.SESSION_DB_WRITE_INTERVAL
+        if not interval:
+            return True
+        # add() only succeeds once per interval, across all processes.
+        return self._cache.add(self.written_key, True, interval)
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        session_key = session_key or self.session_key
+        if session_key is not None:
+            self._cache.delete(self.cache_key_prefix + session_key + ':written')
@@ -1,5 +1,5 @@
 import os
-from decouple import config
+from decouple import Csv, config
 from pathlib import Path
 
 
@@ -24,12 +24,10 @@ DJANGO_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
 ]
-THIRD_PARTY_APPS = [
-    'django_extensions',
-    'debug_toolbar',
-]
+THIRD_PARTY_APPS = []
 LOCAL_APPS = [
     '{{ cookiecutter.project_name }}.users.apps.UsersConfig',
+    '{{ cookiecutter.project_name }}.emails.apps.EmailsConfig',
 ]
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
@@ -37,8 +35,8 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 # MIDDLEWARE
 # --------------------------------------------------------------------
 MIDDLEWARE = [
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'config.metrics.TimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -52,6 +50,21 @@ MIDDLEWARE = [
 # --------------------------------------------------------------------
 ROOT_URLCONF = 'config.urls'
 WSGI_APPLICATION = 'config.wsgi.application'
+# Route async views for the pages and user detail/redirect. Only worth it
+# under an ASGI server; config/asgi.py turns it on unless set explicitly.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+# Clients allowed to scrape /~metrics/, see config/metrics.py.
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1', cast=Csv())
+
+
+# PROXIES
+# --------------------------------------------------------------------
+# Addresses or networks (e.g. 10.0.0.0/8) of reverse proxies in front of
+# the app. Requests from them are taken to be for the client address in
+# CLIENT_IP_HEADER, which throttling and METRICS_ALLOWED_IPS then use. See
+# config/clientip.py.
+TRUSTED_PROXIES = config('TRUSTED_PROXIES', default='', cast=Csv())
+CLIENT_IP_HEADER = config('CLIENT_IP_HEADER', default='X-Forwarded-For')
 
 
 # TEMPLATES
@@ -82,15 +95,80 @@ USE_L10N = True
 USE_TZ = True
 
 
+# DATABASE
+# --------------------------------------------------------------------
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+# Read replicas, see config/db/router.py. After writing, a client reads
+# from the primary for REPLICA_STICKY_SECONDS so it sees its own changes.
+DATABASE_REPLICAS = []
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+
+
 # AUTHENTICATION
 # --------------------------------------------------------------------
 AUTH_USER_MODEL = 'users.User'
+# Loads the logged in user from the cache, see users/backends.py.
+AUTHENTICATION_BACKENDS = [
+    '{{ cookiecutter.project_name }}.users.backends.CachedModelBackend',
+]
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60 * 15, cast=int)
 LOGIN_URL = 'user:login'
 LOGIN_REDIRECT_URL = 'user:redirect'
 LOGOUT_REDIRECT_URL = LOGIN_URL
+# Login and password change attempts per client IP and per username, see
+# users/throttle.py: a burst, then a steady rate per minute. 0 disables.
+LOGIN_THROTTLE_IP_BURST = config('LOGIN_THROTTLE_IP_BURST', default=20, cast=int)
+LOGIN_THROTTLE_IP_PER_MINUTE = config('LOGIN_THROTTLE_IP_PER_MINUTE', default=10, cast=int)
+LOGIN_THROTTLE_USERNAME_BURST = config('LOGIN_THROTTLE_USERNAME_BURST', default=5, cast=int)
+LOGIN_THROTTLE_USERNAME_PER_MINUTE = config('LOGIN_THROTTLE_USERNAME_PER_MINUTE', default=2, cast=int)
+# NDJSON exports of the user directory per user, see UserDirectoryView.
+DIRECTORY_EXPORT_BURST = config('DIRECTORY_EXPORT_BURST', default=3, cast=int)
+DIRECTORY_EXPORT_PER_MINUTE = config('DIRECTORY_EXPORT_PER_MINUTE', default=1, cast=int)
+
+
+# PASSWORD HASHING
+# --------------------------------------------------------------------
+# The first hasher hashes new passwords; the others only verify existing
+# hashes, which are upgraded to the first one on the next login. The same
+# happens when the Argon2 costs below change. Use `manage.py
+# benchmark_hashers` to see what the costs mean in hashes per second.
+PASSWORD_HASHERS = [
+    '{{ cookiecutter.project_name }}.users.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', default=2, cast=int)
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', default=19456, cast=int)  # KiB
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', default=1, cast=int)
+
+
+# CACHES
+# --------------------------------------------------------------------
+# The CACHES backend itself is defined per environment.
+USER_PROFILE_CACHE_TIMEOUT = config('USER_PROFILE_CACHE_TIMEOUT', default=60 * 15, cast=int)
+# Static pages (index, about, contact) served to anonymous visitors. 0 disables.
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=60 * 10, cast=int)
 
 
+# SESSIONS
+# --------------------------------------------------------------------
+# Only used by the config.sessions engine, see SESSION_MODE in production.
+SESSION_DB_WRITE_INTERVAL = config('SESSION_DB_WRITE_INTERVAL', default=60, cast=int)
 
 
+# EMAIL
+# --------------------------------------------------------------------
+# Emails are queued in the database and sent by `manage.py
+# send_queued_mail` with QUEUED_EMAIL_BACKEND, so requests never wait for
+# the mail server.
+EMAIL_BACKEND = '{{ cookiecutter.project_name }}.emails.backends.QueueEmailBackend'
+QUEUED_EMAIL_BACKEND = config('QUEUED_EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 
 
+# AVATARS
+# --------------------------------------------------------------------
+# Uploads are streamed to disk and resized by AVATAR_WORKERS processes
+# outside the request, see users/avatars.py. 0 resizes in the request.
+AVATAR_MAX_UPLOAD_SIZE = config('AVATAR_MAX_UPLOAD_SIZE', default=5 * 1024 * 1024, cast=int)
+AVATAR_WORKERS = config('AVATAR_WORKERS', default=2, cast=int)
@@ -1,3 +1,5 @@
+import sys
+
 from .base import *
 from decouple import config
 
@@ -14,6 +16,20 @@ INTERNAL_IPS = [
 ]
 
 
+# DEVELOPMENT TOOLS
+# --------------------------------------------------------------------
+# The toolbar is only loaded for runserver, so other commands and the
+# tests start faster; set DEBUG_TOOLBAR to choose explicitly, e.g. under
+# an ASGI server. See `manage.py startup_profile`.
+DEBUG_TOOLBAR = config('DEBUG_TOOLBAR', default=sys.argv[1:2] == ['runserver'], cast=bool)
+INSTALLED_APPS += [
+    'django_extensions',
+]
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
+
 # DATABASES
 # --------------------------------------------------------------------
 DATABASES = {
@@ -24,8 +40,32 @@ DATABASES = {
         'PASSWORD': '',
         'HOST': '127.0.0.1',
         'PORT': '5432',
+    },
+    # Stands in for a read replica in users/tests/test_replicas.py. It is
+    # only routed to when DATABASE_ROUTERS is set, and gets its own test
+    # database so that replication lag can be simulated.
+    'replica': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': 'postgres',
+        'USER': 'postgres',
+        'PASSWORD': '',
+        'HOST': '127.0.0.1',
+        'PORT': '5432',
+        'TEST': {'NAME': 'test_postgres_replica'},
+    },
+}
+
+
+# CACHES
+# --------------------------------------------------------------------
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': '{{ cookiecutter.project_name }}',
     }
 }
+# Show template edits right away.
+PAGE_CACHE_TIMEOUT = 0
 
 
 # STATIC FILES (CSS, JS, IMAGES)
@@ -45,7 +85,10 @@ MEDIA_URL = '/media/'
 
 # EMAIL
 # --------------------------------------------------------------------
+# Print emails right away. Set EMAIL_BACKEND to the queue backend from
+# base.py to try `manage.py send_queued_mail`, which prints them too.
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+QUEUED_EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
 
 
@@ -1,5 +1,5 @@
 from .base import *
-from decouple import config
+from decouple import Csv, config
 
 
 # GENERAL
@@ -14,16 +14,92 @@ ALLOWED_HOSTS = [
 
 # DATABASES
 # --------------------------------------------------------------------
+# Connections are persistent (DB_CONN_MAX_AGE) and health checked before
+# reuse. Setting DB_POOL_MAX_SIZE enables a bounded per-process pool instead:
+# connections then go back to the pool after each request, and
+# DB_CONN_MAX_AGE becomes the maximum lifetime of a pooled connection.
+# Pool stats are available from config.db.pool.get_pool_stats().
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=0, cast=int)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'config.db.postgresql',
         'NAME': config('DB_NAME'),
         'USER': config('DB_USER'),
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST'),
         'PORT': config('DB_PORT'),
+        'CONN_MAX_AGE': 0 if DB_POOL_MAX_SIZE else DB_CONN_MAX_AGE,
+        'HEALTH_CHECKS': config('DB_HEALTH_CHECKS', default=True, cast=bool),
+        'POOL': {
+            'MAX_SIZE': DB_POOL_MAX_SIZE,
+            'TIMEOUT': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            'MAX_LIFETIME': DB_CONN_MAX_AGE or None,
+        },
     }
 }
+# Comma-separated replica hosts. Each gets a 'replicaN' alias that reads
+# with the primary's credentials and mirrors the primary in tests.
+for number, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+    DATABASES['replica%s' % number] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('replica%s' % number)
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['config.db.router.PrimaryReplicaRouter']
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.contrib.sessions.middleware.SessionMiddleware'),
+        'config.db.router.ReplicaStickinessMiddleware',
+    )
+
+
+# CACHES
+# --------------------------------------------------------------------
+# Shared by every worker, so any backend reachable by all of them works,
+# e.g. PyLibMCCache or a third-party Redis backend. Memcached is reached
+# through pymemcache; MemcachedCache is deprecated since Django 3.2.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.memcached.PyMemcacheCache'),
+        'LOCATION': config('CACHE_LOCATION', default='127.0.0.1:11211'),
+        'KEY_PREFIX': config('CACHE_KEY_PREFIX', default='{{ cookiecutter.project_name }}'),
+    }
+}
+
+
+# SESSIONS
+# --------------------------------------------------------------------
+# Sessions live in the default cache so requests don't query the session
+# table. SESSION_MODE picks how the database is used:
+#   db            every request reads the table, Django's default
+#   cache         cache only; an evicted session logs the user out
+#   cached_db     reads from the cache, every change is written through
+#   write_behind  like cached_db, but changes reach the database at most
+#                 every SESSION_DB_WRITE_INTERVAL seconds
+# Purge expired rows with `manage.py purge_sessions`.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'write_behind': 'config.sessions',
+}
+SESSION_MODE = config('SESSION_MODE', default='cached_db')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+
+
+# TEMPLATES
+# --------------------------------------------------------------------
+# Compile each template once per process instead of on every render.
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
 
 
 # PASSWORDS
@@ -51,6 +127,63 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
   BASE_DIR / "{{ cookiecutter.project_name }}" / "static",
 ]
+# collectstatic writes content-hashed names plus .gz/.br variants, which
+# the middleware serves with far-future Cache-Control headers.
+STATICFILES_STORAGE = 'config.staticfiles.CompressedManifestStaticFilesStorage'
+MIDDLEWARE.insert(
+    MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+    'config.staticfiles.StaticFilesMiddleware',
+)
+
+
+# EMAIL
+# --------------------------------------------------------------------
+# Used by `manage.py send_queued_mail`, see EMAIL in base.py. The timeout
+# keeps a hung mail server from stalling the worker.
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=10, cast=int)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='webmaster@localhost')
+
+
+# LOGGING
+# --------------------------------------------------------------------
+# JSON lines on stderr: one per request, plus any query slower than
+# SLOW_QUERY_MS with its plan, all tagged with the request's ID. See
+# config/logs.py. SLOW_QUERY_MS=0 turns the slow query log off.
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=200, cast=float)
+MIDDLEWARE.insert(
+    MIDDLEWARE.index('config.metrics.TimingMiddleware') + 1,
+    'config.logs.RequestLogMiddleware',
+)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'config.logs.RequestIDFilter',
+        },
+    },
+    'formatters': {
+        'json': {
+            '()': 'config.logs.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['request_id'],
+            'formatter': 'json',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': config('LOG_LEVEL', default='INFO'),
+    },
+}
 
 
 # MEDIA FILES (UPLOADED BY USERS)
@@ -0,0 +1,193 @@
+"""
+Fingerprinted, precompressed static files served straight from the app
+servers. collectstatic writes hashed copies of every file together with
+.gz and .br variants, and StaticFilesMiddleware serves the smallest variant
+the client accepts with far-future cache headers.
+"""
+import asyncio
+import gzip
+import io
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # optional, only gzip variants are written without it
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.map', '.json', '.svg', '.html', '.txt', '.xml',
+    '.ico', '.ttf', '.otf', '.eot',
+}
+# Variants in order of preference, keyed by Content-Encoding.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MUTABLE_MAX_AGE = 60
+
+
+def gzip_compress(data):
+    buffer = io.BytesIO()
+    # mtime=0 keeps the output identical between collectstatic runs.
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as fh:
+        fh.write(data)
+    return buffer.getvalue()
+
+
+def brotli_compress(data):
+    return brotli.compress(data)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # base.html links a favicon the template does not ship; render its plain
+    # URL rather than failing every page.
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Intermediate names from earlier passes are gone by now, so only
+        # compress the originals and the final hashed copies.
+        for name in sorted(set(paths) | set(self.hashed_files.values())):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        """ Write .gz (and .br) variants that are noticeably smaller. """
+        path = Path(self.path(name))
+        data = path.read_bytes()
+        compressors = [('.gz', gzip_compress)]
+        if brotli is not None:
+            compressors.append(('.br', brotli_compress))
+        for suffix, compress in compressors:
+            compressed = compress(data)
+            variant = path.with_name(path.name + suffix)
+            if len(compressed) < len(data) * 0.95:
+                variant.write_bytes(compressed)
+            elif variant.exists():
+                variant.unlink()
+
+
+class StaticFile:
+    def __init__(self, path, immutable):
+        self.path = path
+        self.immutable = immutable
+        stat = path.stat()
+        self.last_modified = stat.st_mtime
+        self.content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        self.variants = [
+            (encoding, path.with_name(path.name + suffix))
+            for encoding, suffix in ENCODINGS
+            if path.with_name(path.name + suffix).is_file()
+        ]
+
+    def pick(self, accept_encoding):
+        """ Return (path, Content-Encoding) of the best acceptable variant. """
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding, path in self.variants:
+            if encoding in accepted:
+                return path, encoding
+        return self.path, None
+
+
+def parse_accept_encoding(header):
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        match = re.search(r'q=([0-9.]+)', params)
+        if coding and not (match and float(match.group(1)) == 0):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Serve files from STATIC_ROOT. The directory is indexed once when the
+    process starts, so run collectstatic before starting the app servers.
+    Hashed names from the manifest never change content and are cached for
+    a year; anything else is revalidated after a minute.
+    """
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks this instance as async, like Django's MiddlewareMixin.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        self.prefix = settings.STATIC_URL
+        if not self.prefix or '://' in self.prefix or self.prefix.startswith('//'):
+            # Served from another host, e.g. a CDN.
+            raise MiddlewareNotUsed
+        self.files = self.index(Path(settings.STATIC_ROOT))
+
+    def index(self, root):
+        if not root.is_dir():
+            return {}
+        hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        variant_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        files = {}
+        for path in root.rglob('*'):
+            if not path.is_file() or path.name.endswith(variant_suffixes):
+                continue
+            name = path.relative_to(root).as_posix()
+            files[self.prefix + name] = StaticFile(path, immutable=name in hashed_names)
+        return files
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        static_file = self.files.get(request.path) if request.method in ('GET', 'HEAD') else None
+        if static_file is None:
+            return self.get_response(request)
+        return self.serve(request, static_file)
+
+    async def __acall__(self, request):
+        static_file = self.files.get(request.path) if request.method in ('GET', 'HEAD') else None
+        if static_file is None:
+            return await self.get_response(request)
+        # Only stats the file; the ASGI handler streams the FileResponse.
+        return self.serve(request, static_file)
+
+    def serve(self, request, static_file):
+        if not static_file.immutable and not was_modified_since(
+            request.META.get('HTTP_IF_MODIFIED_SINCE'),
+            static_file.last_modified,
+        ):
+            response = HttpResponseNotModified()
+        else:
+            path, encoding = static_file.pick(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=static_file.content_type)
+                response['Content-Length'] = path.stat().st_size
+            else:
+                response = FileResponse(path.open('rb'), content_type=static_file.content_type)
+                # FileResponse names the (possibly .gz) file; browsers don't need it.
+                del response['Content-Disposition']
+            if encoding:
+                response['Content-Encoding'] = encoding
+
+        if static_file.variants:
+            response['Vary'] = 'Accept-Encoding'
+        response['Last-Modified'] = http_date(static_file.last_modified)
+        if static_file.immutable:
+            response['Cache-Control'] = 'public, max-age=%s, immutable' % IMMUTABLE_MAX_AGE
+        else:
+            response['Cache-Control'] = 'public, max-age=%s' % MUTABLE_MAX_AGE
+        return response
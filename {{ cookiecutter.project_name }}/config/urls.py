@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib.auth.views import (
   PasswordResetView,
   PasswordResetDoneView,
@@ -8,22 +9,32 @@ from django.contrib.auth.views import (
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
+from config.metrics import metrics_view
+from {{ cookiecutter.project_name }}.users.decorators import cache_page_for_anonymous
+from {{ cookiecutter.project_name }}.users.views import AsyncTemplateView
+
+PageView = AsyncTemplateView if settings.ASYNC_VIEWS else TemplateView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('about/', TemplateView.as_view(template_name="pages/about.html"), name="about"),
-    path('contact/', TemplateView.as_view(template_name="pages/contact.html"), name="contact"),
+    # ~ can't start a username, so this never shadows a profile.
+    path('~metrics/', metrics_view, name="metrics"),
+    path('about/', cache_page_for_anonymous(PageView.as_view(template_name="pages/about.html")), name="about"),
+    path('contact/', cache_page_for_anonymous(PageView.as_view(template_name="pages/contact.html")), name="contact"),
 
     path('reset-password/', PasswordResetView.as_view(), name="password_reset"),
     path('reset-password/email-sent/', PasswordResetDoneView.as_view(), name="password_reset_done"),
     path('reset-password/<uidb64>/<token>/', PasswordResetConfirmView.as_view(), name="password_reset_confirm"),
     path('reset-password/done/', PasswordResetCompleteView.as_view(), name="password_reset_complete"),
 
-    path('', TemplateView.as_view(template_name="pages/index.html"), name="index"),
+    path('', cache_page_for_anonymous(PageView.as_view(template_name="pages/index.html")), name="index"),
     path('', include('{{ cookiecutter.project_name }}.users.urls', namespace="user")),
 ]
 
-if settings.DEBUG:
+# Uploaded media; in production the web server serves MEDIA_ROOT itself.
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if 'debug_toolbar' in settings.INSTALLED_APPS:
   import debug_toolbar
 
   urlpatterns += [
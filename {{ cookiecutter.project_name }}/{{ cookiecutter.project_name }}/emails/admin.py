@@ -0,0 +1,15 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import QueuedEmail
+
+
+@admin.register(QueuedEmail)
+class QueuedEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'send_after', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('attempts', 'last_error', 'created_at')
+    actions = ['retry']
+
+    @admin.action(description="Retry selected emails now")
+    def retry(self, request, queryset):
+        queryset.update(status=QueuedEmail.PENDING, attempts=0, send_after=timezone.now())
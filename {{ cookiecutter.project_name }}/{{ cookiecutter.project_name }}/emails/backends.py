@@ -0,0 +1,17 @@
+"""
+An email backend that queues instead of sending, so a request that sends
+email (e.g. a password reset) costs one INSERT however slow the mail
+server is. `manage.py send_queued_mail` sends the queue with
+QUEUED_EMAIL_BACKEND.
+"""
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .models import QueuedEmail
+
+
+class QueueEmailBackend(BaseEmailBackend):
+
+    def send_messages(self, email_messages):
+        queued = [QueuedEmail.from_message(message) for message in email_messages if message.recipients()]
+        QueuedEmail.objects.bulk_create(queued)
+        return len(queued)
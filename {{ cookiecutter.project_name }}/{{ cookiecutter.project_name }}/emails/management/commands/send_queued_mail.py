@@ -0,0 +1,127 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from ...models import QueuedEmail
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued emails in batches over one connection to the mail "
+        "server (QUEUED_EMAIL_BACKEND). Failed sends are retried with "
+        "exponential backoff, and marked failed after --max-attempts. Run "
+        "from cron, or keep it running with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int, default=5)
+        parser.add_argument(
+            "--backoff", type=float, default=60,
+            help="Seconds before the first retry; doubled for each one after.",
+        )
+        parser.add_argument("--loop", action="store_true", help="Keep polling the queue.")
+        parser.add_argument(
+            "--interval", type=float, default=5,
+            help="Seconds to sleep with --loop when the queue is empty.",
+        )
+        parser.add_argument(
+            "--lease", type=float, default=300,
+            help=(
+                "Seconds other workers leave a claimed batch alone. A batch "
+                "still unsent by then, e.g. because the worker died, is sent again."
+            ),
+        )
+        parser.add_argument("--backend", help="Defaults to QUEUED_EMAIL_BACKEND.")
+
+    def handle(self, *args, **options):
+        if min(options["batch_size"], options["max_attempts"]) < 1:
+            raise CommandError("--batch-size and --max-attempts must be at least 1.")
+        if options["lease"] <= 0:
+            raise CommandError("--lease must be positive.")
+
+        sender = Sender(
+            options["backend"] or settings.QUEUED_EMAIL_BACKEND,
+            options["max_attempts"],
+            options["backoff"],
+            options["lease"],
+        )
+        sent = failed = 0
+        try:
+            while True:
+                batch_sent, batch_failed = sender.send_batch(options["batch_size"])
+                sent += batch_sent
+                failed += batch_failed
+                if batch_sent + batch_failed < options["batch_size"]:
+                    if not options["loop"]:
+                        break
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("Sent %s emails, %s failed." % (sent, failed))
+
+
+class Sender:
+    """
+    Sends batches of due emails. A batch is claimed in a short transaction
+    that skips rows other workers have locked, then sent without holding
+    any locks, so a slow mail server never keeps a transaction open. Each
+    result is saved as soon as it is known.
+    """
+
+    def __init__(self, backend, max_attempts, backoff, lease=300):
+        self.backend = backend
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+
+    def claim(self, batch_size):
+        """ Mark up to batch_size due emails as sending until the lease
+        runs out, and return them. """
+        with transaction.atomic():
+            batch = list(QueuedEmail.objects.due().select_for_update(skip_locked=True)[:batch_size])
+            QueuedEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                status=QueuedEmail.SENDING,
+                send_after=timezone.now() + timedelta(seconds=self.lease),
+            )
+        return batch
+
+    def send_batch(self, batch_size):
+        """ Returns (sent, failed) for one batch. """
+        batch = self.claim(batch_size)
+        if not batch:
+            return 0, 0
+
+        connection = get_connection(self.backend)
+        try:
+            connection.open()
+        except Exception as error:
+            # The mail server is down; try the whole batch again later.
+            for email in batch:
+                email.failed(error, self.max_attempts, self.backoff)
+            return 0, len(batch)
+
+        sent = failed = 0
+        try:
+            for email in batch:
+                try:
+                    connection.send_messages([email.to_message(connection)])
+                except Exception as error:
+                    email.failed(error, self.max_attempts, self.backoff)
+                    failed += 1
+                    # An SMTP error can leave the connection unusable;
+                    # the backend reopens it for the next email.
+                    connection.close()
+                else:
+                    # Right away, so a worker dying later in the batch
+                    # doesn't get this one sent twice.
+                    email.delete()
+                    sent += 1
+        finally:
+            connection.close()
+        return sent, failed
@@ -0,0 +1,112 @@
+import base64
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives
+from django.db import models
+from django.utils import timezone
+
+
+class QueuedEmailQuerySet(models.QuerySet):
+  def due(self):
+    """ Pending emails whose (next) attempt is due, and emails whose sender
+    stopped before its lease ran out. """
+    return self.filter(status__in=[QueuedEmail.PENDING, QueuedEmail.SENDING], send_after__lte=timezone.now())
+
+
+class QueuedEmail(models.Model):
+  """ An email waiting for `manage.py send_queued_mail`. Sent emails are
+  deleted, since they may hold password reset links. While a worker
+  sends it, its status is sending and send_after is when the worker's
+  lease on it runs out. """
+  PENDING = 'pending'
+  SENDING = 'sending'
+  FAILED = 'failed'
+  STATUS_CHOICES = [
+    (PENDING, 'pending'),
+    (SENDING, 'sending'),
+    (FAILED, 'failed'),
+  ]
+
+  status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+  subject = models.TextField()
+  body = models.TextField()
+  from_email = models.CharField(max_length=254)
+  to = models.JSONField(default=list)
+  cc = models.JSONField(default=list)
+  bcc = models.JSONField(default=list)
+  reply_to = models.JSONField(default=list)
+  headers = models.JSONField(default=dict)
+  # [content, mimetype] pairs, e.g. the HTML version.
+  alternatives = models.JSONField(default=list)
+  # [filename, base64 content, mimetype] triples.
+  attachments = models.JSONField(default=list)
+  attempts = models.PositiveSmallIntegerField(default=0)
+  last_error = models.TextField(blank=True)
+  created_at = models.DateTimeField(auto_now_add=True)
+  send_after = models.DateTimeField(default=timezone.now)
+
+  objects = QueuedEmailQuerySet.as_manager()
+
+  class Meta:
+    ordering = ['id']
+    # The worker only looks at pending and sending emails.
+    indexes = [
+      models.Index(
+        fields=['send_after'], name='emails_due_idx', condition=models.Q(status__in=['pending', 'sending']),
+      ),
+    ]
+
+  @classmethod
+  def from_message(cls, message):
+    attachments = []
+    for attachment in message.attachments:
+      if not isinstance(attachment, tuple):
+        raise ValueError("Only (filename, content, mimetype) attachments can be queued.")
+      filename, content, mimetype = attachment
+      if isinstance(content, str):
+        content = content.encode(message.encoding or 'utf-8')
+      attachments.append([filename, base64.b64encode(content).decode('ascii'), mimetype])
+    return cls(
+      subject=message.subject,
+      body=message.body,
+      from_email=message.from_email,
+      to=list(message.to),
+      cc=list(message.cc),
+      bcc=list(message.bcc),
+      reply_to=list(message.reply_to),
+      headers=dict(message.extra_headers),
+      alternatives=[list(alternative) for alternative in getattr(message, 'alternatives', [])],
+      attachments=attachments,
+    )
+
+  def to_message(self, connection=None):
+    message = EmailMultiAlternatives(
+      subject=self.subject,
+      body=self.body,
+      from_email=self.from_email,
+      to=self.to,
+      cc=self.cc,
+      bcc=self.bcc,
+      reply_to=self.reply_to,
+      headers=self.headers,
+      alternatives=[tuple(alternative) for alternative in self.alternatives],
+      connection=connection,
+    )
+    for filename, content, mimetype in self.attachments:
+      message.attach(filename, base64.b64decode(content), mimetype)
+    return message
+
+  def failed(self, error, max_attempts, backoff):
+    """ Record a failed attempt and schedule the next one, backing off
+    exponentially, or give up after max_attempts. """
+    self.attempts += 1
+    self.last_error = str(error)
+    if self.attempts >= max_attempts:
+      self.status = self.FAILED
+    else:
+      self.status = self.PENDING
+      self.send_after = timezone.now() + timedelta(seconds=backoff * 2 ** (self.attempts - 1))
+    self.save(update_fields=['attempts', 'last_error', 'status', 'send_after'])
+
+  def __str__(self):
+    return "%s to %s" % (self.subject, ", ".join(self.to))
@@ -0,0 +1,145 @@
+from io import StringIO
+from django.conf import settings
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from {{ cookiecutter.project_name }}.emails.management.commands.send_queued_mail import Sender
+from {{ cookiecutter.project_name }}.emails.models import QueuedEmail
+from {{ cookiecutter.project_name }}.users.models import User
+
+QUEUE_BACKEND = '{{ cookiecutter.project_name }}.emails.backends.QueueEmailBackend'
+
+
+class BrokenBackend(LocmemBackend):
+  """ A mail server that accepts connections but refuses every email. """
+
+  def send_messages(self, messages):
+    raise ConnectionRefusedError("mail server is down")
+
+
+class CountingBackend(LocmemBackend):
+  opened = 0
+
+  def open(self):
+    CountingBackend.opened += 1
+
+
+class TransactionCheckingBackend(LocmemBackend):
+  in_transaction = []
+
+  def send_messages(self, messages):
+    TransactionCheckingBackend.in_transaction.append(connection.in_atomic_block)
+    return super().send_messages(messages)
+
+
+def backend_path(backend):
+  return "%s.%s" % (__name__, backend.__name__)
+
+
+@override_settings(
+  EMAIL_BACKEND=QUEUE_BACKEND,
+  QUEUED_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class QueuedEmailTest(TestCase):
+
+  def send_queued_mail(self, *args):
+    stdout = StringIO()
+    call_command("send_queued_mail", *args, stdout=stdout)
+    return stdout.getvalue()
+
+  def test_password_reset_is_queued(self):
+    """ Ensures a reset request queues the email instead of sending it. """
+    User.objects.create_user(username="anon", email="anon@test.com", password="pw")
+    response = self.client.post(reverse('password_reset'), {"email": "anon@test.com"})
+    self.assertRedirects(response, reverse('password_reset_done'), fetch_redirect_response=False)
+    self.assertEqual(len(mail.outbox), 0)
+    self.assertEqual(QueuedEmail.objects.count(), 1)
+
+    self.assertEqual(self.send_queued_mail(), "Sent 1 emails, 0 failed.\n")
+    self.assertEqual(len(mail.outbox), 1)
+    self.assertEqual(mail.outbox[0].to, ["anon@test.com"])
+    self.assertIn("/reset-password/", mail.outbox[0].body)
+    # Sent emails are deleted with their reset links.
+    self.assertFalse(QueuedEmail.objects.exists())
+
+  def test_message_round_trip(self):
+    message = EmailMultiAlternatives(
+      "subject", "body", "from@test.com", ["to@test.com"],
+      cc=["cc@test.com"], bcc=["bcc@test.com"], reply_to=["reply@test.com"],
+      headers={"X-Test": "1"},
+    )
+    message.attach_alternative("<p>body</p>", "text/html")
+    message.attach("data.bin", b"\x00\xff", "application/octet-stream")
+    message.send()
+    self.send_queued_mail()
+
+    self.assertEqual(len(mail.outbox), 1)
+    sent = mail.outbox[0]
+    for attr in ("subject", "body", "from_email", "to", "cc", "bcc", "reply_to", "extra_headers", "alternatives"):
+      self.assertEqual(getattr(sent, attr), getattr(message, attr))
+    self.assertEqual(sent.attachments, [("data.bin", b"\x00\xff", "application/octet-stream")])
+
+  def test_batches_share_a_connection(self):
+    for i in range(5):
+      mail.send_mail("subject %s" % i, "body", "from@test.com", ["to@test.com"])
+    CountingBackend.opened = 0
+    self.assertEqual(
+      self.send_queued_mail("--backend", backend_path(CountingBackend), "--batch-size", "2"),
+      "Sent 5 emails, 0 failed.\n",
+    )
+    self.assertEqual(len(mail.outbox), 5)
+    self.assertEqual(CountingBackend.opened, 3)
+
+  def test_failed_emails_are_retried_with_backoff(self):
+    mail.send_mail("subject", "body", "from@test.com", ["to@test.com"])
+    broken = backend_path(BrokenBackend)
+
+    self.assertEqual(self.send_queued_mail("--backend", broken, "--backoff", "60"), "Sent 0 emails, 1 failed.\n")
+    email = QueuedEmail.objects.get()
+    self.assertEqual((email.status, email.attempts), (QueuedEmail.PENDING, 1))
+    self.assertEqual(email.last_error, "mail server is down")
+    self.assertGreater(email.send_after, timezone.now())
+    # Not due yet.
+    self.assertEqual(self.send_queued_mail(), "Sent 0 emails, 0 failed.\n")
+
+    QueuedEmail.objects.update(send_after=timezone.now())
+    self.send_queued_mail("--backend", broken, "--max-attempts", "2")
+    email.refresh_from_db()
+    self.assertEqual((email.status, email.attempts), (QueuedEmail.FAILED, 2))
+    QueuedEmail.objects.update(send_after=timezone.now())
+    self.assertEqual(self.send_queued_mail(), "Sent 0 emails, 0 failed.\n")
+    self.assertEqual(len(mail.outbox), 0)
+
+  def test_claimed_emails_are_skipped(self):
+    """ Ensures a batch another worker is sending is left alone until
+    that worker's lease runs out. """
+    for i in range(2):
+      mail.send_mail("subject %s" % i, "body", "from@test.com", ["to@test.com"])
+    [claimed] = Sender(settings.QUEUED_EMAIL_BACKEND, 5, 60, lease=300).claim(1)
+    claimed.refresh_from_db()
+    self.assertEqual(claimed.status, QueuedEmail.SENDING)
+    self.assertGreater(claimed.send_after, timezone.now())
+
+    self.assertEqual(self.send_queued_mail(), "Sent 1 emails, 0 failed.\n")
+    self.assertEqual(mail.outbox[0].subject, "subject 1")
+    QueuedEmail.objects.update(send_after=timezone.now())
+    self.assertEqual(self.send_queued_mail(), "Sent 1 emails, 0 failed.\n")
+    self.assertFalse(QueuedEmail.objects.exists())
+
+
+@override_settings(EMAIL_BACKEND=QUEUE_BACKEND)
+class SendOutsideTransactionTest(TransactionTestCase):
+
+  def test_sends_outside_transaction(self):
+    """ Ensures no transaction, and so no row lock, is held while talking
+    to the mail server. """
+    mail.send_mail("subject", "body", "from@test.com", ["to@test.com"])
+    TransactionCheckingBackend.in_transaction = []
+    call_command("send_queued_mail", "--backend", backend_path(TransactionCheckingBackend), stdout=StringIO())
+    self.assertEqual(TransactionCheckingBackend.in_transaction, [False])
+    self.assertFalse(QueuedEmail.objects.exists())
@@ -1,7 +1,129 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from .cache import invalidate_auth_user, invalidate_profile
 from .models import User
 
-admin.site.register(User)
+AFTER_VAR = 'after'
+# Below this many rows an exact COUNT(*) is cheap enough.
+EXACT_COUNT_LIMIT = 10000
 
 
+def estimated_count(queryset):
+    """ The planner's row estimate for queryset, or the exact count if the
+    estimate is small. """
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < EXACT_COUNT_LIMIT:
+        return queryset.count()
+    return estimate
 
+
+def set_active(queryset, is_active):
+    """
+    Activate or deactivate the selected users with one UPDATE, however many
+    there are, and drop their cached profiles and logins. Returns how many
+    changed.
+    """
+    db = router.db_for_write(User)
+    connection = connections[db]
+    selected = queryset.exclude(is_active=is_active).order_by().values('pk')
+    sql, params = selected.query.get_compiler(db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE %(table)s SET %(is_active)s = %%s, %(updated_at)s = %%s '
+            'WHERE %(pk)s IN (%(selected)s) RETURNING %(pk)s, %(username)s' % {
+                'table': connection.ops.quote_name(User._meta.db_table),
+                'is_active': connection.ops.quote_name('is_active'),
+                'updated_at': connection.ops.quote_name('updated_at'),
+                'pk': connection.ops.quote_name(User._meta.pk.column),
+                'username': connection.ops.quote_name('username'),
+                'selected': sql,
+            },
+            [is_active, timezone.now(), *params],
+        )
+        rows = cursor.fetchall()
+    invalidate_profile(*[username for pk, username in rows])
+    invalidate_auth_user(*[pk for pk, username in rows])
+    return len(rows)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Pages through users newest first by primary key (?after=<pk>) instead
+    of with OFFSET, so every page costs the same however far in it is, and
+    shows an estimated count instead of counting every row.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        return lookup_params
+
+    def get_ordering(self, request, queryset):
+        return ['-pk']
+
+    def get_results(self, request):
+        try:
+            after = int(self.params[AFTER_VAR])
+        except (KeyError, ValueError):
+            after = None
+        queryset = self.queryset if after is None else self.queryset.filter(pk__lt=after)
+        rows = list(queryset[:self.list_per_page + 1])
+
+        self.result_list = rows[:self.list_per_page]
+        self.result_count = estimated_count(self.queryset)
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        # Turns off the numbered page links; see admin/users/user/pagination.html.
+        self.can_show_all = False
+        self.multi_page = False
+        self.paginator = None
+        self.first_page_url = None if after is None else self.get_query_string(remove=[AFTER_VAR])
+        self.next_page_url = None
+        if len(rows) > self.list_per_page:
+            self.next_page_url = self.get_query_string({AFTER_VAR: self.result_list[-1].pk})
+
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = ('username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'date_joined')
+    list_filter = ('is_active', 'is_staff')
+    # Only used to show the search box, see get_search_results().
+    search_fields = ('username', 'email')
+    ordering = ('-pk',)
+    sortable_by = ()
+    show_full_result_count = False
+    actions = ['activate', 'deactivate']
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        """ Case-insensitive prefix search on username or email, which the
+        LOWER(...) text_pattern_ops indexes can answer. """
+        term = search_term.strip().lower()
+        if not term:
+            return queryset, False
+        queryset = queryset.alias(
+            username_lower=Lower('username'), email_lower=Lower('email'),
+        ).filter(Q(username_lower__startswith=term) | Q(email_lower__startswith=term))
+        return queryset, False
+
+    @admin.action(description="Activate selected users")
+    def activate(self, request, queryset):
+        count = set_active(queryset, True)
+        self.message_user(request, "Activated %s users." % count, messages.SUCCESS)
+
+    @admin.action(description="Deactivate selected users")
+    def deactivate(self, request, queryset):
+        # Keep admins from locking themselves out.
+        count = set_active(queryset.exclude(pk=request.user.pk), False)
+        self.message_user(request, "Deactivated %s users." % count, messages.SUCCESS)
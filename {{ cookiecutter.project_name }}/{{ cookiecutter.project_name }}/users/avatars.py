@@ -0,0 +1,214 @@
+"""
+Avatars. An upload streams to a temporary file and is hashed on the way
+(AvatarUploadHandler). The original is stored under its SHA-256, and
+render_variants() makes square JPEGs at AVATAR_SIZES in a process pool
+after the response has gone out. User.avatar is set to the hash once
+they're saved, so the profile page never links to a missing file.
+
+Every file is named after the content it came from, so the same image
+uploaded twice is stored once and a URL always serves the same bytes;
+the web server can cache MEDIA_URL/avatars/ forever.
+"""
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import connections
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Square variants, in pixels. The profile page shows DISPLAY_SIZE, and
+# twice that on high density screens.
+AVATAR_SIZES = (80, 160, 320)
+DISPLAY_SIZE = 160
+FORMATS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+# Larger images take too much memory to decode.
+MAX_PIXELS = 6000 * 6000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class AvatarStorage(FileSystemStorage):
+    """
+    A file that exists already has the same content, since names are
+    content hashes, so it is never written again. New files are written
+    to a temporary name and renamed, so a half-written file is never
+    served.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in content.chunks():
+                    fh.write(chunk)
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, full_path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        return name
+
+
+avatar_storage = AvatarStorage()
+
+
+class AvatarUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every upload to a temporary file, however small, and hashes
+    it on the way. Past AVATAR_MAX_UPLOAD_SIZE the rest is read but not
+    kept, and AvatarForm rejects the file by its size.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= settings.AVATAR_MAX_UPLOAD_SIZE:
+            self.sha256.update(raw_data)
+            self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.sha256.hexdigest()
+        return upload
+
+
+def original_name(digest, image_format):
+    return "avatars/%s/%s.%s" % (digest[:2], digest, FORMATS[image_format])
+
+
+def variant_name(digest, size):
+    return "avatars/%s/%s-%s.jpg" % (digest[:2], digest, size)
+
+
+def avatar_url(digest, size=DISPLAY_SIZE):
+    return avatar_storage.url(variant_name(digest, size)) if digest else ""
+
+
+def render_variants(path, sizes):
+    """ Square JPEGs of the image at path, as {size: bytes}. Runs in the
+    process pool, so it only needs Pillow. """
+    with Image.open(path) as image:
+        # A JPEG can be decoded at a fraction of its size, which is faster.
+        image.draft("RGB", (2 * max(sizes), 2 * max(sizes)))
+        image = ImageOps.exif_transpose(image).convert("RGBA")
+    # Flatten transparency onto white, which JPEG can't store.
+    flat = Image.new("RGB", image.size, (255, 255, 255))
+    flat.paste(image, mask=image.getchannel("A"))
+    variants = {}
+    for size in sorted(sizes, reverse=True):
+        flat = ImageOps.fit(flat, (size, size), Image.LANCZOS)
+        out = io.BytesIO()
+        flat.save(out, "JPEG", quality=85, optimize=True)
+        variants[size] = out.getvalue()
+    return variants
+
+
+def get_executor(broken=None):
+    """ The shared pool, replaced first if it is broken, the pool a worker
+    died in (e.g. killed for using too much memory). """
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor is broken:
+            _executor.shutdown(wait=False)
+            _executor = None
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.AVATAR_WORKERS)
+        return _executor
+
+
+def submit_render(path, sizes):
+    """ Start render_variants() in the pool, in a new pool if the current
+    one is broken, and return (pool, future). Raises BrokenProcessPool if
+    the new pool is broken too. """
+    executor = get_executor()
+    try:
+        return executor, executor.submit(render_variants, path, sizes)
+    except BrokenProcessPool:
+        logger.warning("Avatar process pool is broken, starting a new one.")
+        executor = get_executor(broken=executor)
+        return executor, executor.submit(render_variants, path, sizes)
+
+
+def save_avatar(user, upload):
+    """
+    Store an upload that AvatarForm has accepted and make it user's avatar
+    once its variants exist. Returns a Future that is done by then; with
+    AVATAR_WORKERS = 0, or no working pool, the variants are made right
+    away.
+    """
+    digest = upload.sha256
+    name = avatar_storage.save(original_name(digest, upload.image_format), upload)
+    missing = [size for size in AVATAR_SIZES if not avatar_storage.exists(variant_name(digest, size))]
+    done = Future()
+    future = None
+    if missing and settings.AVATAR_WORKERS:
+        try:
+            executor, future = submit_render(avatar_storage.path(name), missing)
+        except BrokenProcessPool:
+            logger.exception("Avatar process pool is broken, resizing %s in the request.", digest)
+    if future is None:
+        store_variants(user.pk, digest, render_variants(avatar_storage.path(name), missing) if missing else {})
+        done.set_result(digest)
+        return done
+
+    request_thread = threading.current_thread()
+
+    def finish(future):
+        # Runs on the pool's own thread after the request is over, unless
+        # the future was done before this was added.
+        try:
+            store_variants(user.pk, digest, future.result())
+        except BrokenProcessPool as error:
+            # The image may be what killed the worker, so it isn't retried,
+            # but later uploads get a new pool.
+            logger.exception("Avatar process pool broke resizing %s for user %s.", digest, user.pk)
+            get_executor(broken=executor)
+            done.set_exception(error)
+        except Exception as error:
+            logger.exception("Resizing avatar %s for user %s failed.", digest, user.pk)
+            done.set_exception(error)
+        else:
+            done.set_result(digest)
+        finally:
+            if threading.current_thread() is not request_thread:
+                connections.close_all()
+
+    future.add_done_callback(finish)
+    return done
+
+
+def store_variants(user_pk, digest, variants):
+    for size, data in variants.items():
+        avatar_storage.save(variant_name(digest, size), ContentFile(data))
+    try:
+        user = get_user_model().objects.get(pk=user_pk)
+    except get_user_model().DoesNotExist:
+        return
+    user.avatar = digest
+    # save() also drops the cached profile.
+    user.save(update_fields=["avatar", "updated_at"])
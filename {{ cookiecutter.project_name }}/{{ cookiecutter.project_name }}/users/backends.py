@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import auth_user_cache_key
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that reads the logged in user for each request from the
+    cache instead of the database. User.save() and delete() drop the
+    cached user.
+
+    The cache is shared, so the cached copy has no password hash, only
+    the session hash made from it; django.contrib.auth.get_user() checks
+    that against the session, so a session from before a password change
+    is rejected as usual. Misses are read from the primary, since a
+    lagging replica could bring back a user from before a password change
+    or soft delete for AUTH_USER_CACHE_TIMEOUT.
+    """
+
+    def get_user(self, user_id):
+        key = auth_user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = get_user_model()._default_manager.db_manager(DEFAULT_DB_ALIAS).get(pk=user_id)
+            except get_user_model().DoesNotExist:
+                return None
+            if not self.user_can_authenticate(user):
+                return None
+            user._session_auth_hash = user.get_session_auth_hash()
+            user.password = None
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
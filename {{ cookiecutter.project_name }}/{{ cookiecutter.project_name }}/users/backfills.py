@@ -0,0 +1,120 @@
+"""
+Backfills rewrite existing rows in small chunks instead of with one UPDATE
+that locks the whole table. A backfill walks its queryset by primary key,
+commits after every chunk together with a BackfillCheckpoint, and so picks
+up after the last committed chunk when it is run again. Run them with
+`manage.py backfill <name>`; add new ones to BACKFILLS.
+"""
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.utils import timezone
+from .cache import invalidate_auth_user, invalidate_profile
+from .models import BackfillCheckpoint, User
+
+
+class Backfill:
+    name = None
+    help = ""
+    model = None
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def process(self, pks):
+        """ Update the rows with these primary keys and return how many
+        changed. Runs in the chunk's transaction. """
+        raise NotImplementedError
+
+
+class LowercaseUsernamesAndEmails(Backfill):
+    """ CreateUserForm lowercases usernames and emails; this does the same
+    for users created before it did. """
+
+    name = "lowercase_usernames_emails"
+    help = "Lowercase usernames and emails stored with capitals."
+    model = User
+
+    def process(self, pks):
+        # The LOWER() unique indexes from migration 0002 already make
+        # usernames and emails unique ignoring case, so this can't collide.
+        db = router.db_for_write(User)
+        connection = connections[db]
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE %(table)s AS new SET %(username)s = LOWER(old.%(username)s), '
+                '%(email)s = LOWER(old.%(email)s), %(updated_at)s = %%s '
+                'FROM (SELECT %(pk)s, %(username)s, %(email)s FROM %(table)s '
+                'WHERE %(pk)s = ANY(%%s) FOR UPDATE) AS old '
+                'WHERE new.%(pk)s = old.%(pk)s AND (old.%(username)s <> LOWER(old.%(username)s) '
+                'OR old.%(email)s <> LOWER(old.%(email)s)) '
+                'RETURNING new.%(pk)s, old.%(username)s, new.%(username)s' % {
+                    'table': quote(User._meta.db_table),
+                    'pk': quote(User._meta.pk.column),
+                    'username': quote('username'),
+                    'email': quote('email'),
+                    'updated_at': quote('updated_at'),
+                },
+                [timezone.now(), list(pks)],
+            )
+            rows = cursor.fetchall()
+        transaction.on_commit(lambda: self.invalidate(rows), using=db)
+        return len(rows)
+
+    def invalidate(self, rows):
+        invalidate_profile(*[username for pk, old, new in rows for username in (old, new)])
+        invalidate_auth_user(*[pk for pk, old, new in rows])
+
+
+BACKFILLS = {backfill.name: backfill for backfill in (LowercaseUsernamesAndEmails,)}
+
+
+def replica_lag(aliases=None):
+    """ The most any replica is behind the primary, in seconds. """
+    lag = 0.0
+    for alias in settings.DATABASE_REPLICAS if aliases is None else aliases:
+        with connections[alias].cursor() as cursor:
+            # NULL on a server that is not replaying WAL.
+            cursor.execute(
+                "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+            )
+            lag = max(lag, float(cursor.fetchone()[0]))
+    return lag
+
+
+def run_backfill(backfill, chunk_size, pause=0, max_lag=None, restart=False, log=None):
+    """
+    Run backfill chunk_size rows at a time from its checkpoint, sleeping
+    pause seconds between chunks and, with max_lag, for as long as a replica
+    is more than max_lag seconds behind. Returns the checkpoint.
+    """
+    db = router.db_for_write(backfill.model) or DEFAULT_DB_ALIAS
+    checkpoint, created = BackfillCheckpoint.objects.using(db).get_or_create(name=backfill.name)
+    if restart and not created:
+        checkpoint.delete()
+        checkpoint = BackfillCheckpoint.objects.using(db).create(name=backfill.name)
+    if checkpoint.finished_at:
+        return checkpoint
+
+    # Always read from the primary, which the checkpoint is written to.
+    queryset = backfill.get_queryset().using(db).order_by("pk")
+    while True:
+        with transaction.atomic(using=db):
+            pks = list(queryset.filter(pk__gt=checkpoint.last_pk).values_list("pk", flat=True)[:chunk_size])
+            if pks:
+                checkpoint.rows_changed += backfill.process(pks)
+                checkpoint.rows_seen += len(pks)
+                checkpoint.last_pk = pks[-1]
+            else:
+                checkpoint.finished_at = timezone.now()
+            checkpoint.save(using=db)
+        if not pks:
+            return checkpoint
+        if log:
+            log(checkpoint)
+        if pause:
+            time.sleep(pause)
+        while max_lag is not None and replica_lag() > max_lag:
+            time.sleep(max(pause, 1))
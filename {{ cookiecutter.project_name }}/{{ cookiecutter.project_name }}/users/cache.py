@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PROFILE_KEY = "users:profile:{}"
+CHANGED_KEY = "users:profile:changed:{}"
+AUTH_USER_KEY = "users:auth:{}"
+HITS_KEY = "users:profile:hits"
+MISSES_KEY = "users:profile:misses"
+
+
+def profile_cache_key(username):
+    return PROFILE_KEY.format(username)
+
+
+def get_profile(username):
+    """
+    Read-through lookup of an active user by username, with only the public
+    profile columns loaded. Returns None if there is no such user. Misses
+    are not cached, so a user created later will be found on the next lookup.
+    """
+    key = profile_cache_key(username)
+    user = cache.get(key)
+    if user is not None:
+        _incr(HITS_KEY)
+        return user
+
+    _incr(MISSES_KEY)
+    User = get_user_model()
+    queryset = User.active.public_profile()
+    if settings.DATABASE_REPLICAS and cache.get(CHANGED_KEY.format(username)):
+        # The replicas may not have the change yet, and whatever is read
+        # here is cached for everyone.
+        queryset = queryset.using(DEFAULT_DB_ALIAS)
+    try:
+        user = queryset.get(username=username)
+    except User.DoesNotExist:
+        return None
+    cache.set(key, user, settings.USER_PROFILE_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_profile(*usernames):
+    """ Drop the cached profiles of the given usernames. """
+    usernames = [username for username in usernames if username]
+    cache.delete_many([profile_cache_key(username) for username in usernames])
+    if settings.DATABASE_REPLICAS:
+        cache.set_many(
+            {CHANGED_KEY.format(username): True for username in usernames},
+            settings.REPLICA_STICKY_SECONDS,
+        )
+
+
+def auth_user_cache_key(user_id):
+    return AUTH_USER_KEY.format(user_id)
+
+
+def invalidate_auth_user(*user_ids):
+    """ Drop the cached logged in users with the given ids, see users/backends.py. """
+    cache.delete_many([auth_user_cache_key(user_id) for user_id in user_ids if user_id is not None])
+
+
+def get_stats():
+    """ Hit/miss counters shared by every process using the same cache. """
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def _incr(key):
+    """ One round trip once the counter exists; cache.incr() raises if it
+    doesn't. """
+    try:
+        cache.incr(key)
+    except ValueError:
+        # add() so a concurrent first increment isn't lost.
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
@@ -0,0 +1,59 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import add_never_cache_headers
+from django.views.decorators.cache import cache_page
+
+
+def cache_page_for_anonymous(view_func):
+    """
+    Serve a page from the cache for anonymous visitors without pending
+    messages, for PAGE_CACHE_TIMEOUT seconds. Everyone else gets a freshly
+    rendered page, since base.html shows who is logged in and any messages.
+    Browsers are told not to keep their own copy for the same reason.
+    Works for both sync and async views.
+    """
+
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if await sync_to_async(use_page_cache)(request):
+                # The cache middleware is synchronous; on a miss the view
+                # itself still runs on the event loop.
+                cached_view = cache_page(settings.PAGE_CACHE_TIMEOUT)(async_to_sync(view_func))
+                response = await sync_to_async(cached_view)(request, *args, **kwargs)
+            else:
+                response = await view_func(request, *args, **kwargs)
+            return add_no_browser_cache(response)
+
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if use_page_cache(request):
+            response = cache_page(settings.PAGE_CACHE_TIMEOUT)(view_func)(request, *args, **kwargs)
+        else:
+            response = view_func(request, *args, **kwargs)
+        return add_no_browser_cache(response)
+
+    return wrapper
+
+
+def use_page_cache(request):
+    return bool(
+        settings.PAGE_CACHE_TIMEOUT
+        and not request.user.is_authenticated
+        and not len(messages.get_messages(request))
+    )
+
+
+def add_no_browser_cache(response):
+    if hasattr(response, "add_post_render_callback"):
+        # Runs after cache_page has stored the rendered response.
+        response.add_post_render_callback(add_never_cache_headers)
+    else:
+        add_never_cache_headers(response)
+    return response
@@ -1,11 +1,61 @@
 from django import forms as django_forms
+from django.conf import settings
 from django.contrib.auth import forms, get_user_model
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from PIL import Image
+from .avatars import FORMATS, MAX_PIXELS
 
 User = get_user_model()
 
+UNIQUE_ERRORS = {
+    "username": "Username has already been taken.",
+    "email": "Email has already been taken.",
+}
 
-class CreateUserForm(forms.UserCreationForm):
+
+def unique_violation_field(error):
+    """
+    Return the field an IntegrityError was raised for, or None if it was not
+    a username/email uniqueness violation. Both the plain unique constraints
+    and the LOWER() indexes carry the column name in their name.
+    """
+    diag = getattr(error.__cause__, "diag", None)
+    constraint = getattr(diag, "constraint_name", None) or str(error)
+    for field in UNIQUE_ERRORS:
+        if field in constraint:
+            return field
+    return None
+
+
+class UniqueFieldsMixin:
+    """
+    Leave username/email uniqueness to the database's unique indexes rather
+    than querying for duplicates before saving. A violation is turned into
+    the same field error the pre-check used to raise; save() then returns
+    None and the form is no longer valid.
+    """
+
+    def validate_unique(self):
+        exclude = self._get_validation_exclusions()
+        exclude.extend(field for field in UNIQUE_ERRORS if field not in exclude)
+        self.instance.validate_unique(exclude=exclude)
+
+    def save(self, commit=True):
+        if not commit:
+            return super().save(commit=False)
+        try:
+            with transaction.atomic():
+                return super().save()
+        except IntegrityError as error:
+            field = unique_violation_field(error)
+            if field is None or field not in self.fields:
+                raise
+            self.add_error(field, UNIQUE_ERRORS[field])
+            return None
+
+
+class CreateUserForm(UniqueFieldsMixin, forms.UserCreationForm):
     class Meta(forms.UserCreationForm.Meta):
         model = User
         fields = forms.UserCreationForm.Meta.fields + (
@@ -15,35 +65,40 @@ class CreateUserForm(forms.UserCreationForm):
         )
 
     def clean_username(self):
-        username = self.cleaned_data["username"].lower()
-
-        if User.objects.filter(username=username).exists():
-            raise ValidationError("Username has already been taken.")
-        else:
-            return username
+        return self.cleaned_data["username"].lower()
 
     def clean_email(self):
-        email = self.cleaned_data["email"].lower()
+        return self.cleaned_data["email"].lower()
 
-        if User.objects.filter(email=email).exists():
-            raise ValidationError("Email has already been taken.")
-        else:
-            return email
 
-
-class UpdateUserForm(django_forms.ModelForm):
+class UpdateUserForm(UniqueFieldsMixin, django_forms.ModelForm):
     class Meta:
         model = User
         fields = ["first_name", "last_name", "email"]
 
     def clean_email(self):
-        initial_email = self.initial["email"]
-        cleaned_email = self.cleaned_data["email"].lower()
+        return self.cleaned_data["email"].lower()
+
 
-        if initial_email == cleaned_email:
-            return cleaned_email
-        elif User.objects.filter(email=cleaned_email).exists():
-            raise ValidationError("Email has already been taken.")
-        else:
-            return cleaned_email
+class AvatarForm(django_forms.Form):
+    avatar = django_forms.FileField()
 
+    def clean_avatar(self):
+        """ Only read the image's header here; it is decoded and resized
+        outside the request, see users/avatars.py. """
+        upload = self.cleaned_data["avatar"]
+        if upload.size > settings.AVATAR_MAX_UPLOAD_SIZE:
+            raise ValidationError(
+                "Avatars can be at most %s MB." % (settings.AVATAR_MAX_UPLOAD_SIZE // (1024 * 1024)),
+            )
+        try:
+            with Image.open(upload.temporary_file_path()) as image:
+                image_format, (width, height) = image.format, image.size
+        except (OSError, Image.DecompressionBombError):
+            image_format = None
+        if image_format not in FORMATS:
+            raise ValidationError("Upload a JPEG, PNG, GIF or WebP image.")
+        if width * height > MAX_PIXELS:
+            raise ValidationError("The image is too large.")
+        upload.image_format = image_format
+        return upload
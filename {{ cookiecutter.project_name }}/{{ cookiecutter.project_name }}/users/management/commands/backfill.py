@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from {{ cookiecutter.project_name }}.users.backfills import BACKFILLS, run_backfill
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a backfill over an existing table in small chunks, committing "
+        "after each one. An interrupted backfill carries on from its last "
+        "committed chunk when run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", nargs="?", choices=sorted(BACKFILLS))
+        parser.add_argument("--list", action="store_true", help="List the backfills and exit.")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause", type=float, default=0.1,
+            help="Seconds to sleep between chunks, so replicas can keep up.",
+        )
+        parser.add_argument(
+            "--max-lag", type=float, default=None,
+            help="Wait while any replica is more than this many seconds behind.",
+        )
+        parser.add_argument("--restart", action="store_true", help="Start over from the first row.")
+
+    def handle(self, *args, **options):
+        if options["list"]:
+            for name, backfill in sorted(BACKFILLS.items()):
+                self.stdout.write("%-40s %s" % (name, backfill.help))
+            return
+        if options["name"] is None:
+            raise CommandError("Give the name of a backfill, see --list.")
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        def log(checkpoint):
+            if options["verbosity"] > 1:
+                self.stdout.write("Up to id %s: %s rows, %s changed." % (
+                    checkpoint.last_pk, checkpoint.rows_seen, checkpoint.rows_changed,
+                ))
+
+        backfill = BACKFILLS[options["name"]]()
+        try:
+            checkpoint = run_backfill(
+                backfill, chunk_size, options["pause"], options["max_lag"], options["restart"], log,
+            )
+        except KeyboardInterrupt:
+            raise CommandError("Interrupted; run again to carry on from the last committed chunk.")
+        self.stdout.write("%s finished at %s: %s rows, %s changed." % (
+            backfill.name, checkpoint.finished_at, checkpoint.rows_seen, checkpoint.rows_changed,
+        ))
@@ -0,0 +1,256 @@
+import json
+import queue
+import secrets
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.shortcuts import resolve_url
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from ...cache import invalidate_profile
+from .benchmark_handlers import CLIENT_ADDR
+
+User = get_user_model()
+
+PASSWORD = "bench-Horse-battery-7"
+SCENARIOS = ("register", "login", "detail", "update-account", "change-password")
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the account flows in this process: seed users, then send "
+        "register, login, detail, update-account and change-password requests "
+        "through the URLconf with the test client, from several threads. "
+        "Reports req/s, latency percentiles and queries per request, and saves "
+        "the results as JSON. Seeded users are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100, help="Users to seed.")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+        parser.add_argument("--host", default="localhost", help="Must be in ALLOWED_HOSTS.")
+        parser.add_argument(
+            "--output",
+            help="Where to save the JSON results. Defaults to bench-results/<time>-<commit>.json.",
+        )
+        parser.add_argument("--compare", help="Earlier results to print the change against.")
+
+    def handle(self, *args, **options):
+        if min(options["users"], options["requests"], options["concurrency"]) < 1:
+            raise CommandError("--users, --requests and --concurrency must be at least 1.")
+        previous = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as fh:
+                    previous = json.load(fh)["scenarios"]
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError("Cannot read %s: %s" % (options["compare"], error))
+
+        bench = Bench(options["host"], options["users"])
+        self.stdout.write("Seeding %s users (DEBUG=%s)..." % (options["users"], settings.DEBUG))
+        bench.seed()
+        results = {}
+        try:
+            # Every request comes from one address, which the login
+            # throttle would soon answer with 429s.
+            with override_settings(LOGIN_THROTTLE_IP_BURST=0, LOGIN_THROTTLE_USERNAME_BURST=0):
+                for scenario in options["scenarios"]:
+                    results[scenario] = bench.run(scenario, options["requests"], options["concurrency"])
+        finally:
+            bench.clean_up()
+
+        self.stdout.write("%-16s %8s %7s %9s %8s %8s %8s %9s" % (
+            "scenario", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms", "queries",
+        ))
+        for scenario, result in results.items():
+            self.stdout.write("%-16s %8s %7s %9.1f %8.1f %8.1f %8.1f %9.1f" % (
+                scenario, result["requests"], result["errors"], result["rps"],
+                result["p50_ms"], result["p95_ms"], result["p99_ms"], result["queries_per_request"],
+            ))
+            if previous and scenario in previous:
+                before = previous[scenario]
+                self.stdout.write("%-16s %8s %7s %+8.1f%% %+7.1f%% %+7.1f%% %+7.1f%% %+9.1f" % (
+                    "  vs. compared", "", "",
+                    change(before["rps"], result["rps"]),
+                    change(before["p50_ms"], result["p50_ms"]),
+                    change(before["p95_ms"], result["p95_ms"]),
+                    change(before["p99_ms"], result["p99_ms"]),
+                    result["queries_per_request"] - before["queries_per_request"],
+                ))
+
+        commit = git_commit()
+        output = options["output"]
+        if output is None:
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            output = Path(settings.BASE_DIR) / "bench-results" / ("%s-%s.json" % (stamp, commit or "nogit"))
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w") as fh:
+            json.dump({
+                "commit": commit,
+                "time": datetime.now(timezone.utc).isoformat(),
+                "settings": settings.SETTINGS_MODULE,
+                "debug": settings.DEBUG,
+                "options": {
+                    key: options[key] for key in ("users", "requests", "concurrency", "scenarios")
+                },
+                "scenarios": results,
+            }, fh, indent=2)
+            fh.write("\n")
+        self.stdout.write("Saved %s." % output)
+
+
+class Bench:
+    """ Seeds users and runs each scenario against them. """
+
+    def __init__(self, host, users):
+        self.host = host
+        self.users = users
+        self.prefix = "bench%s-" % secrets.token_hex(3)
+        self.clients = []
+
+    def username(self, i):
+        return "%s%s" % (self.prefix, i % self.users)
+
+    def client(self, user=None):
+        client = Client(HTTP_HOST=self.host, REMOTE_ADDR=CLIENT_ADDR)
+        if user is not None:
+            client.force_login(user)
+        self.clients.append(client)
+        return client
+
+    def seed(self):
+        # One hash for everyone; hashing each would take longer than the run.
+        self.password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(
+                username=self.username(i), email="%s@example.com" % self.username(i),
+                first_name="bench", last_name=str(i), password=self.password,
+            )
+            for i in range(self.users)
+        ])
+
+    def clean_up(self):
+        for client in self.clients:
+            client.logout()
+        self.clients = []
+        usernames = list(User.objects.filter(username__startswith=self.prefix).values_list("username", flat=True))
+        User.objects.filter(username__in=usernames).delete()
+        invalidate_profile(*usernames)
+
+    def prepare(self, scenario, i):
+        """
+        Everything one request needs, as (client, method, path, data,
+        expected status, expected redirect). A redirect anywhere else, e.g.
+        to the login page, counts as an error.
+        """
+        username = self.username(i)
+        if scenario == "register":
+            new = "%snew%s" % (self.prefix, i)
+            return self.client(), "post", reverse("user:register"), {
+                "username": new, "email": "%s@example.com" % new, "first_name": "bench",
+                "last_name": str(i), "password1": PASSWORD, "password2": PASSWORD,
+            }, 302, reverse("user:detail", kwargs={"username": new})
+        if scenario == "login":
+            return self.client(), "post", reverse("user:login"), {
+                "username": username, "password": PASSWORD,
+            }, 302, resolve_url(settings.LOGIN_REDIRECT_URL)
+        if scenario == "detail":
+            return self.client(), "get", reverse("user:detail", kwargs={"username": username}), None, 200, None
+
+        if scenario == "update-account":
+            user = User.objects.get(username=username)
+            return self.client(user), "post", reverse("user:update_account", kwargs={"username": username}), {
+                "first_name": "bench", "last_name": str(i), "email": user.email,
+            }, 302, reverse("user:detail", kwargs={"username": username})
+        # Changing a password logs out the user's other sessions, so each
+        # request gets a user of its own. The password stays the same.
+        username = "%spw%s" % (self.prefix, i)
+        user = User.objects.create(
+            username=username, email="%s@example.com" % username, first_name="bench",
+            last_name=str(i), password=self.password,
+        )
+        return self.client(user), "post", reverse("user:password_change", kwargs={"username": username}), {
+            "old_password": PASSWORD, "new_password1": PASSWORD, "new_password2": PASSWORD,
+        }, 302, reverse("user:detail", kwargs={"username": username})
+
+    def run(self, scenario, requests, concurrency):
+        jobs = queue.Queue()
+        for i in range(requests):
+            jobs.put(self.prepare(scenario, i))
+        latencies, queries, errors = [], [], []
+        counter = threading.local()
+
+        def count_queries(execute, sql, params, many, context):
+            counter.queries += 1
+            return execute(sql, params, many, context)
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        client, method, path, data, status, location = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    counter.queries = 0
+                    # Each thread has its own connection to count queries on.
+                    with connection.execute_wrapper(count_queries):
+                        start = time.perf_counter()
+                        response = getattr(client, method)(path, data)
+                        latencies.append(time.perf_counter() - start)
+                    queries.append(counter.queries)
+                    if response.status_code != status or response.get("Location") != location:
+                        errors.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            "requests": requests,
+            "errors": len(errors),
+            "rps": requests / elapsed,
+            "p50_ms": 1000 * percentile(latencies, 50),
+            "p95_ms": 1000 * percentile(latencies, 95),
+            "p99_ms": 1000 * percentile(latencies, 99),
+            "queries_per_request": sum(queries) / len(queries),
+        }
+
+
+def percentile(values, pct):
+    """ Nearest-rank percentile of sorted values. """
+    index = max(0, -(-len(values) * pct // 100) - 1)
+    return values[index]
+
+
+def change(before, after):
+    return 100 * (after - before) / before if before else 0.0
+
+
+def git_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
@@ -0,0 +1,141 @@
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.urls import resolve, reverse
+
+User = get_user_model()
+
+# A documentation address, never in INTERNAL_IPS, so the debug toolbar
+# stays out of the numbers.
+CLIENT_ADDR = "192.0.2.1"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests per second through Django's WSGI and ASGI handlers "
+        "on a user detail page, in this process and without a server. Set "
+        "ASYNC_VIEWS=True to route the async views, as config/asgi.py does."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", help="Defaults to the first active user.")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument(
+            "--concurrency", type=int, default=10,
+            help="Threads for WSGI, tasks on one event loop for ASGI.",
+        )
+        parser.add_argument("--host", default="localhost", help="Must be in ALLOWED_HOSTS.")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1.")
+        username = options["username"]
+        if username is None:
+            username = User.active.order_by("pk").values_list("username", flat=True).first()
+            if username is None:
+                raise CommandError("There are no active users, pass --username.")
+
+        path = reverse("user:detail", kwargs={"username": username})
+        view = resolve(path).func.view_class.__name__
+        self.stdout.write("GET %s (%s, DEBUG=%s)" % (path, view, settings.DEBUG))
+        self.stdout.write("%-6s %10s %10s %10s" % ("", "req/s", "mean ms", "p95 ms"))
+
+        for name, run in (("WSGI", run_wsgi), ("ASGI", run_asgi)):
+            # One untimed request so both start with a warm cache.
+            run(path, options["host"], 1, 1)
+            start = time.perf_counter()
+            latencies = run(path, options["host"], options["requests"], options["concurrency"])
+            elapsed = time.perf_counter() - start
+            latencies.sort()
+            self.stdout.write("%-6s %10.1f %10.2f %10.2f" % (
+                name,
+                len(latencies) / elapsed,
+                1000 * sum(latencies) / len(latencies),
+                1000 * latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0],
+            ))
+
+
+def run_wsgi(path, host, requests, concurrency):
+    application = get_wsgi_application()
+
+    def request(_):
+        statuses = []
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": "",
+            "SERVER_NAME": host,
+            "SERVER_PORT": "80",
+            "HTTP_HOST": host,
+            "REMOTE_ADDR": CLIENT_ADDR,
+            "wsgi.input": io.BytesIO(),
+            "wsgi.errors": sys.stderr,
+            "wsgi.url_scheme": "http",
+        }
+        start = time.perf_counter()
+        response = application(environ, lambda status, headers: statuses.append(status))
+        b"".join(response)
+        response.close()
+        check_status(statuses[0].split()[0])
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(request, range(requests)))
+
+
+def run_asgi(path, host, requests, concurrency):
+    application = get_asgi_application()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", host.encode())],
+        "client": (CLIENT_ADDR, 0),
+        "server": (host, 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def request():
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        start = time.perf_counter()
+        await application(dict(scope), receive, send)
+        check_status(messages[0]["status"])
+        return time.perf_counter() - start
+
+    async def worker(count, latencies):
+        for _ in range(count):
+            latencies.append(await request())
+
+    async def main():
+        latencies = []
+        counts = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+        await asyncio.gather(*(worker(count, latencies) for count in counts))
+        return latencies
+
+    return asyncio.run(main())
+
+
+def check_status(status):
+    if int(status) != 200:
+        raise CommandError("The detail page returned %s." % status)
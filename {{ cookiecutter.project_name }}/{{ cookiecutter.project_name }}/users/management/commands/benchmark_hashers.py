@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Report how many hashes per second one process manages with each "
+        "hasher in PASSWORD_HASHERS. Every login, registration and password "
+        "change costs one hash, which helps sizing workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seconds", type=float, default=2.0,
+            help="How long to benchmark each hasher for.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("%-60s %12s %12s" % ("hasher", "hashes/s", "ms/hash"))
+        for hasher in get_hashers():
+            name = "%s.%s" % (hasher.__module__, hasher.__class__.__name__)
+            if hasher.library:
+                try:
+                    hasher._load_library()
+                except ValueError:
+                    self.stdout.write("%-60s %25s" % (name, "library not installed"))
+                    continue
+
+            rate = measure(hasher, options["seconds"])
+            self.stdout.write("%-60s %12.1f %12.1f" % (name, rate, 1000 / rate))
+
+
+def measure(hasher, seconds):
+    """ Hashes per second, including the salt generation a real hash needs. """
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        hasher.encode("benchmark-password", hasher.salt())
+        count += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - start)
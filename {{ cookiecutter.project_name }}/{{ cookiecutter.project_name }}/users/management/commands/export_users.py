@@ -0,0 +1,62 @@
+import csv
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from .import_users import FIELDS, guess_format
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Export users to CSV or JSON Lines. Rows are streamed from a server-side "
+        "cursor, so memory use does not grow with the number of users. Passwords "
+        "are exported as hashes; re-import them with import_users --hashed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help='Output file, or "-" for stdout.')
+        parser.add_argument(
+            "--format", choices=["csv", "jsonl"],
+            help="Output format. Guessed from the file extension, or csv for stdout.",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--active-only", action="store_true")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path == "-" else guess_format(path))
+
+        users = User.objects.order_by("pk")
+        if options["active_only"]:
+            users = users.filter(is_active=True)
+        rows = users.values_list(*FIELDS).iterator(chunk_size=options["batch_size"])
+
+        if path == "-":
+            count = write_rows(self.stdout, rows, fmt)
+        else:
+            try:
+                with open(path, "w", encoding="utf-8", newline="") as fh:
+                    count = write_rows(fh, rows, fmt)
+            except OSError as error:
+                raise CommandError(error)
+            self.stdout.write("Exported %s users to %s." % (count, path))
+
+
+def write_rows(fh, rows, fmt):
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(fh, lineterminator="\n")
+        writer.writerow(FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            record = dict(zip(FIELDS, row))
+            record["date_joined"] = record["date_joined"].isoformat()
+            fh.write(json.dumps(record) + "\n")
+            count += 1
+    return count
@@ -0,0 +1,205 @@
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ...forms import UNIQUE_ERRORS, unique_violation_field
+
+User = get_user_model()
+
+FIELDS = ("username", "email", "first_name", "last_name", "password", "is_active", "date_joined")
+TRUE_VALUES = ("1", "true", "t", "yes", "y")
+
+
+class RowError(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import users from a CSV or JSON Lines file. The file is streamed "
+        "and inserted in batches; rows that fail are reported and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='File to import, or "-" for stdin.')
+        parser.add_argument(
+            "--format", choices=["csv", "jsonl"],
+            help="Input format. Guessed from the file extension by default.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="Processes used to hash passwords. 0 hashes in this process.",
+        )
+        parser.add_argument(
+            "--hashed", action="store_true",
+            help="Passwords are already hashed, e.g. taken from export_users.",
+        )
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        self.hashed = options["hashed"]
+        self.workers = options["workers"] if not self.hashed else 0
+        self.executor = None
+        if self.workers:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=django.setup)
+
+        imported = failed = 0
+        try:
+            with open_input(options["path"]) as fh:
+                rows = read_rows(fh, fmt)
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+                    created, errors = self.import_batch(batch)
+                    imported += created
+                    failed += len(errors)
+                    for line, message in errors:
+                        self.stderr.write("line %s: %s" % (line, message))
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+
+        self.stdout.write("Imported %s users, %s rows failed." % (imported, failed))
+
+    def import_batch(self, batch):
+        """ Build, validate and insert one batch. Returns (created, errors). """
+        users, lines, raw_passwords, errors = [], [], [], []
+        for line, row in batch:
+            try:
+                user, password = build_user(row, self.hashed)
+            except RowError as error:
+                errors.append((line, str(error)))
+                continue
+            users.append(user)
+            lines.append(line)
+            raw_passwords.append(password)
+
+        if not self.hashed:
+            for user, password in zip(users, self.hash_passwords(raw_passwords)):
+                user.password = password
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+            return len(users), errors
+        except IntegrityError:
+            pass
+
+        # Some row clashes with an existing user; insert one by one to find it.
+        created = 0
+        for line, user in zip(lines, users):
+            try:
+                with transaction.atomic():
+                    user.save(force_insert=True)
+                created += 1
+            except IntegrityError as error:
+                field = unique_violation_field(error)
+                errors.append((line, UNIQUE_ERRORS[field] if field else str(error)))
+        errors.sort()
+        return created, errors
+
+    def hash_passwords(self, passwords):
+        if self.executor is None:
+            return [make_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self.executor.map(make_password, passwords, chunksize=chunksize))
+
+
+def guess_format(path):
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if path.endswith(".csv"):
+        return "csv"
+    raise CommandError("Cannot guess the format of %r, pass --format." % path)
+
+
+def open_input(path):
+    if path == "-":
+        return os.fdopen(os.dup(sys.stdin.fileno()), encoding="utf-8", newline="")
+    try:
+        return open(path, encoding="utf-8", newline="")
+    except OSError as error:
+        raise CommandError(error)
+
+
+def read_rows(fh, fmt):
+    """ Yield (line number, row dict) without reading the whole file. """
+    if fmt == "csv":
+        reader = csv.DictReader(fh)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line, text in enumerate(fh, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as error:
+            row = {"__error__": "invalid JSON (%s)" % error}
+        if not isinstance(row, dict):
+            row = {"__error__": "expected a JSON object"}
+        yield line, row
+
+
+def build_user(row, hashed):
+    """ Return an unsaved, validated user and the password to hash. """
+    if "__error__" in row:
+        raise RowError(row["__error__"])
+
+    values = {field: row.get(field) for field in FIELDS}
+    user = User(
+        username=str(values["username"] or "").strip().lower(),
+        email=str(values["email"] or "").strip().lower(),
+        first_name=str(values["first_name"] or ""),
+        last_name=str(values["last_name"] or ""),
+    )
+    if values["is_active"] not in (None, ""):
+        user.is_active = str(values["is_active"]).strip().lower() in TRUE_VALUES
+    if values["date_joined"]:
+        date_joined = parse_datetime(str(values["date_joined"]))
+        if date_joined is None:
+            raise RowError("date_joined: invalid datetime %r" % values["date_joined"])
+        if timezone.is_naive(date_joined):
+            date_joined = timezone.make_aware(date_joined, timezone.utc)
+        user.date_joined = date_joined
+
+    # Names may be blank, as they are for users made with createsuperuser.
+    exclude = ["password"] + [field for field in ("first_name", "last_name") if not getattr(user, field)]
+    try:
+        user.full_clean(exclude=exclude, validate_unique=False)
+    except ValidationError as error:
+        raise RowError("; ".join(
+            "%s: %s" % (field, " ".join(messages))
+            for field, messages in error.message_dict.items()
+        ))
+
+    password = str(values["password"]) if values["password"] not in (None, "") else None
+    if hashed:
+        if password is None:
+            user.set_unusable_password()
+        else:
+            try:
+                identify_hasher(password)
+            except ValueError:
+                raise RowError("password: not a recognised password hash")
+            user.password = password
+    return user, password
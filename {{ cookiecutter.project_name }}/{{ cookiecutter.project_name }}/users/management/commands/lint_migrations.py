@@ -0,0 +1,141 @@
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations import operations
+from django.db.migrations.exceptions import AmbiguityError
+from django.db.migrations.loader import MigrationLoader
+from config.db.operations import SetNotNull
+
+BLOCKING_SQL = [
+    (re.compile(r"\bCREATE\s+(UNIQUE\s+)?INDEX\s+(?!CONCURRENTLY)", re.I),
+     "CREATE INDEX blocks writes while it runs; use CREATE INDEX CONCURRENTLY in a non-atomic migration."),
+    (re.compile(r"\bDROP\s+INDEX\s+(?!CONCURRENTLY)", re.I),
+     "DROP INDEX blocks reads and writes; use DROP INDEX CONCURRENTLY in a non-atomic migration."),
+    (re.compile(r"\bALTER\s+TABLE\b", re.I),
+     "ALTER TABLE takes a lock that blocks reads and writes; check it can't rewrite or scan the table."),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Check migrations for operations that lock busy tables for long "
+        "enough to block logins. By default every unapplied migration is "
+        "checked against the user model; run it before migrate on deploy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("app_label", nargs="?", help="Only check this app's migrations.")
+        parser.add_argument("migration_name", nargs="?", help="Only check this migration.")
+        parser.add_argument(
+            "--model", action="append", dest="models", metavar="APP_LABEL.MODEL",
+            help="A busy model to check operations on; may be repeated. Defaults to AUTH_USER_MODEL.",
+        )
+        parser.add_argument("--all", action="store_true", help="Check applied migrations too.")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        loader = MigrationLoader(connection)
+        models = set()
+        for label in options["models"] or [settings.AUTH_USER_MODEL]:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError) as error:
+                raise CommandError(str(error))
+            models.add((model._meta.app_label, model._meta.model_name))
+
+        app_label, name = options["app_label"], options["migration_name"]
+        if app_label is not None and app_label not in loader.migrated_apps:
+            raise CommandError("App '%s' does not have migrations." % app_label)
+        if name is not None:
+            try:
+                migration = loader.get_migration_by_prefix(app_label, name)
+            except (AmbiguityError, KeyError) as error:
+                raise CommandError("Cannot find migration %s.%s: %s" % (app_label, name, error))
+            keys = [(migration.app_label, migration.name)]
+        else:
+            keys = []
+            for leaf in loader.graph.leaf_nodes(app_label):
+                for key in loader.graph.forwards_plan(leaf):
+                    if key not in keys and (app_label is None or key[0] == app_label):
+                        keys.append(key)
+            if not options["all"]:
+                keys = [key for key in keys if key not in loader.applied_migrations]
+
+        problems = 0
+        for key in keys:
+            state = loader.project_state(key, at_end=False)
+            for operation, problem in lint_migration(loader.graph.nodes[key], state, models, connection):
+                problems += 1
+                self.stdout.write("%s.%s: %s: %s" % (key[0], key[1], operation.describe(), problem))
+        if problems:
+            raise CommandError("%s blocking operations in %s migrations." % (problems, len(keys)))
+        self.stdout.write("No blocking operations in %s migrations." % len(keys))
+
+
+def lint_migration(migration, state, models, connection):
+    """
+    Yield (operation, problem) for each operation in migration that would
+    lock one of models, given as (app_label, model_name) pairs, for longer
+    than a moment. state is the project state before migration.
+    """
+    tables = {state.apps.get_model(*model)._meta.db_table for model in models if model in state.models}
+    for operation in migration.operations:
+        if isinstance(operation, (AddIndexConcurrently, RemoveIndexConcurrently, SetNotNull)):
+            if migration.atomic:
+                yield operation, "Runs concurrently, which needs atomic = False on the migration."
+        elif isinstance(operation, operations.RunSQL):
+            sql = operation.sql if isinstance(operation.sql, (list, tuple)) else [operation.sql]
+            sql = "\n".join(statement if isinstance(statement, str) else statement[0] for statement in sql)
+            if any(re.search(r'\b"?%s"?\b' % re.escape(table), sql) for table in tables):
+                for pattern, problem in BLOCKING_SQL:
+                    if pattern.search(sql):
+                        yield operation, problem
+                        break
+        elif isinstance(operation, operations.RunPython):
+            if any(model[0] == migration.app_label for model in models):
+                yield operation, (
+                    "Updates run in the migration's transaction and keep their row locks "
+                    "until it ends; use a backfill (manage.py backfill) instead."
+                )
+        elif (migration.app_label, getattr(operation, "model_name_lower", None)) in models:
+            problem = lint_model_operation(operation, migration.app_label, state, connection)
+            if problem:
+                yield operation, problem
+        operation.state_forwards(migration.app_label, state)
+
+
+def lint_model_operation(operation, app_label, state, connection):
+    if isinstance(operation, operations.AddIndex):
+        return "Blocks writes while the index is built; use AddIndexConcurrently."
+    if isinstance(operation, operations.RemoveIndex):
+        return "Blocks reads and writes until running queries finish; use RemoveIndexConcurrently."
+    if isinstance(operation, operations.AddConstraint):
+        return "Checks every row while blocking writes; add it NOT VALID and validate it separately."
+    if isinstance(operation, (operations.RemoveField, operations.RenameField)):
+        return "Breaks servers still running the old code; deploy code that stops using the field first."
+    if isinstance(operation, operations.AddField):
+        field = operation.field
+        if field.unique or field.db_index or (field.remote_field and field.db_constraint):
+            return (
+                "Builds an index or checks a foreign key while blocking writes; add the field "
+                "without it, then use AddIndexConcurrently."
+            )
+    if isinstance(operation, operations.AlterField):
+        old = state.apps.get_model(app_label, operation.model_name)._meta.get_field(operation.name)
+        new = operation.field.clone()
+        new.set_attributes_from_name(operation.name)
+        if old.null and not new.null:
+            return "Scans the table while blocking reads and writes; backfill it, then use SetNotNull."
+        old_type, new_type = old.db_parameters(connection)["type"], new.db_parameters(connection)["type"]
+        # Making a varchar longer only changes the catalog.
+        longer = type(old) is type(new) and old.max_length and new.max_length and new.max_length >= old.max_length
+        if old_type != new_type and not longer:
+            return "Changing the column type rewrites the table while blocking reads and writes."
+        if (new.unique and not old.unique) or (new.db_index and not old.db_index):
+            return "Blocks writes while the index is built; use AddIndexConcurrently."
+    return None
@@ -0,0 +1,46 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions from the database in small chunks, so the "
+        "table is never locked by one long DELETE. Use instead of "
+        "clearsessions with a database-backed SESSION_MODE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause", type=float, default=0,
+            help="Seconds to sleep between chunks, to leave room for other queries.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        deleted = purge_expired_sessions(chunk_size, options["pause"])
+        self.stdout.write("Deleted %s expired sessions." % deleted)
+
+
+def purge_expired_sessions(chunk_size, pause=0):
+    """ Delete sessions that expired before now, chunk_size rows at a time. """
+    now = timezone.now()
+    expired = Session.objects.filter(expire_date__lt=now)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            keys = list(expired.values_list("session_key", flat=True)[:chunk_size])
+            if not keys:
+                break
+            # Re-check expiry in case a session was extended in the meantime.
+            deleted += expired.filter(session_key__in=keys).delete()[0]
+        if pause:
+            time.sleep(pause)
+    return deleted
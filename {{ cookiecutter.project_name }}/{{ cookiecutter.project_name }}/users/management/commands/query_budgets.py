@@ -0,0 +1,66 @@
+import json
+import math
+import pkgutil
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from ...tests import budget
+from ... import tests
+
+# DB time varies between runs and machines, so --update leaves headroom.
+DB_MS_HEADROOM = 3
+DB_MS_MINIMUM = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the users tests and list the SQL queries and database time each "
+        "query budget uses, next to its budget in users/tests/query_budgets.json."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--update", action="store_true",
+            help="Write the measured numbers to the baseline instead of enforcing it.",
+        )
+
+    def handle(self, *args, **options):
+        labels = sorted(
+            "%s.%s" % (tests.__name__, module.name)
+            for module in pkgutil.iter_modules(tests.__path__)
+            if module.name.startswith("test_")
+        )
+        budget.enforce = not options["update"]
+        try:
+            call_command("test", *labels, interactive=False, verbosity=0)
+        except SystemExit as error:
+            # The test command exits on failure; report what was measured.
+            if error.code:
+                self.stderr.write("Some tests failed.")
+        finally:
+            budget.enforce = True
+
+        if not budget.measured:
+            raise CommandError("No test used a query budget.")
+        baseline = {} if options["update"] else budget.load_baseline()
+
+        self.stdout.write("%-36s %8s %8s %10s %10s" % ("budget", "queries", "max", "db ms", "max ms"))
+        for name, used in sorted(budget.measured.items()):
+            limit = baseline.get(name, {})
+            self.stdout.write("%-36s %8s %8s %10.1f %10s" % (
+                name, used["queries"], limit.get("queries", "-"), used["db_ms"], limit.get("db_ms", "-"),
+            ))
+
+        if options["update"]:
+            baseline = {
+                name: {
+                    "queries": used["queries"],
+                    "db_ms": max(DB_MS_MINIMUM, math.ceil(used["db_ms"] * DB_MS_HEADROOM)),
+                }
+                for name, used in sorted(budget.measured.items())
+            }
+            with open(budget.BASELINE_PATH, "w") as fh:
+                json.dump(baseline, fh, indent=2)
+                fh.write("\n")
+            self.stdout.write("Wrote %s." % budget.BASELINE_PATH)
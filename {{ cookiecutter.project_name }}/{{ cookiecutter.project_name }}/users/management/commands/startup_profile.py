@@ -0,0 +1,104 @@
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter, since this process has imported everything
+# already. Prints the timings as JSON; -X importtime writes to stderr.
+PROFILE_SCRIPT = """
+import json
+import time
+
+start = time.perf_counter()
+import django
+from django.apps.config import AppConfig
+
+ready_times = []
+create = AppConfig.create
+
+
+def timed_create(entry):
+    app_config = create(entry)
+    ready = app_config.ready
+
+    def timed_ready():
+        begin = time.perf_counter()
+        ready()
+        ready_times.append([app_config.label, time.perf_counter() - begin])
+
+    app_config.ready = timed_ready
+    return app_config
+
+
+AppConfig.create = timed_create
+django.setup()
+setup = time.perf_counter() - start
+
+from importlib import import_module
+from django.conf import settings
+
+begin = time.perf_counter()
+import_module(settings.ROOT_URLCONF)
+print(json.dumps(dict(setup=setup, urls=time.perf_counter() - begin, ready=ready_times)))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Start Django in a fresh interpreter with the current settings and "
+        "report how long setup, each AppConfig.ready() and importing the "
+        "URLconf take, and which modules are slowest to import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20, help="Modules to list.")
+        parser.add_argument("--sort", choices=("self", "cumulative"), default="cumulative")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROFILE_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        imports, errors = parse_importtime(result.stderr)
+        if result.returncode:
+            raise CommandError("Starting Django failed:\n%s" % "\n".join(errors))
+        timings = json.loads(result.stdout.splitlines()[-1])
+
+        self.stdout.write("%s: %.0f ms to set up Django, %.0f ms to import the URLconf." % (
+            settings.SETTINGS_MODULE, 1000 * timings["setup"], 1000 * timings["urls"],
+        ))
+
+        self.stdout.write("\n%-40s %10s" % ("AppConfig.ready()", "ms"))
+        for label, seconds in sorted(timings["ready"], key=lambda item: -item[1]):
+            self.stdout.write("%-40s %10.1f" % (label, 1000 * seconds))
+
+        packages = Counter()
+        for module, self_us, cumulative_us in imports:
+            packages[module.partition(".")[0]] += self_us
+        self.stdout.write("\n%-40s %10s" % ("imports by package", "ms"))
+        for package, self_us in packages.most_common(options["limit"]):
+            self.stdout.write("%-40s %10.1f" % (package, self_us / 1000))
+
+        column = 1 if options["sort"] == "self" else 2
+        self.stdout.write("\n%-50s %10s %14s" % ("module", "self ms", "cumulative ms"))
+        for module, self_us, cumulative_us in sorted(imports, key=lambda row: -row[column])[:options["limit"]]:
+            self.stdout.write("%-50s %10.1f %14.1f" % (module, self_us / 1000, cumulative_us / 1000))
+
+
+def parse_importtime(stderr):
+    """ Split -X importtime output into (module, self us, cumulative us)
+    rows and the other lines, such as a traceback. """
+    imports, other = [], []
+    for line in stderr.splitlines():
+        if line.startswith("import time:"):
+            self_us, cumulative_us, module = line[len("import time:"):].split("|")
+            if self_us.strip().isdigit():
+                imports.append((module.strip(), int(self_us), int(cumulative_us)))
+        else:
+            other.append(line)
+    return imports, other
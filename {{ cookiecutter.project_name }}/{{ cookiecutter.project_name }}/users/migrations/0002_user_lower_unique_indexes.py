@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Case-insensitive uniqueness for usernames and emails; the forms rely on
+    these indexes instead of querying for duplicates first. Django 3.2 can
+    index LOWER(), but a unique constraint on an expression needs Django
+    4.0, so these are plain SQL.
+
+    The plain unique indexes from 0001 stay. LOWER() indexes only answer
+    LOWER() lookups, while logins (ModelBackend's get_by_natural_key()) and
+    ModelForm's unique checks look up the exact value among all users, soft
+    deleted ones included, which the partial indexes in 0003 leave out.
+    Dropping them would also mean redefining AbstractUser.username without
+    unique=True, which the auth system checks flag. They cost one more
+    index update per signup.
+    """
+
+    # CONCURRENTLY can't run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                # Left over if an earlier run failed, see AddIndexConcurrently.
+                'DROP INDEX CONCURRENTLY IF EXISTS "users_user_username_lower_uniq";',
+                'CREATE UNIQUE INDEX CONCURRENTLY "users_user_username_lower_uniq" ON "users_user" (LOWER("username"));',
+            ],
+            reverse_sql='DROP INDEX CONCURRENTLY "users_user_username_lower_uniq";',
+        ),
+        migrations.RunSQL(
+            sql=[
+                'DROP INDEX CONCURRENTLY IF EXISTS "users_user_email_lower_uniq";',
+                'CREATE UNIQUE INDEX CONCURRENTLY "users_user_email_lower_uniq" ON "users_user" (LOWER("email"));',
+            ],
+            reverse_sql='DROP INDEX CONCURRENTLY "users_user_email_lower_uniq";',
+        ),
+    ]
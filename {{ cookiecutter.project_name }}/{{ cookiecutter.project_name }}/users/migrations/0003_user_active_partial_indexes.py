@@ -0,0 +1,24 @@
+# Generated by Django 3.0 on 2026-10-17 18:04
+
+from django.db import migrations, models
+from config.db.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('users', '0002_user_lower_unique_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(condition=models.Q(is_active=True), fields=['username'], name='users_active_username_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(condition=models.Q(is_active=True), fields=['email'], name='users_active_email_idx'),
+        ),
+    ]
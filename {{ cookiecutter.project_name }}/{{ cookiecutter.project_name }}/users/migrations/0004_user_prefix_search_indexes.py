@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Indexes for the case-insensitive prefix search in the user admin. The
+    unique LOWER(...) indexes from 0002 use the database collation, which
+    LIKE 'prefix%' cannot use; text_pattern_ops can.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('users', '0003_user_active_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                'DROP INDEX CONCURRENTLY IF EXISTS "users_user_username_lower_prefix";',
+                'CREATE INDEX CONCURRENTLY "users_user_username_lower_prefix" ON "users_user" (LOWER("username") text_pattern_ops);',
+            ],
+            reverse_sql='DROP INDEX CONCURRENTLY "users_user_username_lower_prefix";',
+        ),
+        migrations.RunSQL(
+            sql=[
+                'DROP INDEX CONCURRENTLY IF EXISTS "users_user_email_lower_prefix";',
+                'CREATE INDEX CONCURRENTLY "users_user_email_lower_prefix" ON "users_user" (LOWER("email") text_pattern_ops);',
+            ],
+            reverse_sql='DROP INDEX CONCURRENTLY "users_user_email_lower_prefix";',
+        ),
+    ]
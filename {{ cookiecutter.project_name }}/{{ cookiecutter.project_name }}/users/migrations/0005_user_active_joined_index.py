@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-17 18:40
+
+from django.db import migrations, models
+from config.db.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('users', '0004_user_prefix_search_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(condition=models.Q(is_active=True), fields=['date_joined', 'id'], name='users_active_joined_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_backfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
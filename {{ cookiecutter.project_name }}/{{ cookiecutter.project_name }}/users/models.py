@@ -1,12 +1,95 @@
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.db import models, transaction
 from django.urls import reverse
+from .avatars import DISPLAY_SIZE, avatar_url
+from .cache import invalidate_auth_user, invalidate_profile
+
+# The columns users/detail.html renders.
+PUBLIC_PROFILE_FIELDS = ("id", "username", "first_name", "last_name", "email", "avatar")
+
+
+class UserQuerySet(models.QuerySet):
+  def public_profile(self):
+    """ Only load the columns shown on a profile page, and updated_at for
+    its ETag. """
+    return self.only(*PUBLIC_PROFILE_FIELDS, "updated_at")
+
+
+class ActiveUserManager(models.Manager.from_queryset(UserQuerySet)):
+  """ Users that have not been soft deleted, see UserDeleteView. """
+
+  def get_queryset(self):
+    return super().get_queryset().filter(is_active=True)
 
 
 class User(AbstractUser):
   first_name = models.CharField(max_length=30, verbose_name='first name')
   last_name = models.CharField(max_length=150, verbose_name='last name')
   email = models.EmailField(unique=True, verbose_name='email address')
+  updated_at = models.DateTimeField(auto_now=True)
+  # SHA-256 of the uploaded image, see users/avatars.py.
+  avatar = models.CharField(max_length=64, blank=True)
+
+  objects = UserManager()
+  active = ActiveUserManager()
+
+  class Meta(AbstractUser.Meta):
+    # Lookups through User.active only touch these smaller indexes, which
+    # leave out soft deleted users.
+    indexes = [
+      models.Index(fields=['username'], name='users_active_username_idx', condition=models.Q(is_active=True)),
+      models.Index(fields=['email'], name='users_active_email_idx', condition=models.Q(is_active=True)),
+      # Keyset pagination in UserDirectoryView.
+      models.Index(fields=['date_joined', 'id'], name='users_active_joined_idx', condition=models.Q(is_active=True)),
+    ]
+
+  @classmethod
+  def from_db(cls, db, field_names, values):
+    """ Remember the loaded username so a rename also drops the old cache entry. """
+    instance = super().from_db(db, field_names, values)
+    instance._loaded_username = instance.__dict__.get("username")
+    return instance
+
+  def get_session_auth_hash(self):
+    """ Users from CachedModelBackend carry the hash without the password. """
+    if "_session_auth_hash" in self.__dict__:
+      return self._session_auth_hash
+    return super().get_session_auth_hash()
+
+  def save(self, *args, **kwargs):
+    if "_session_auth_hash" in self.__dict__:
+      raise ValueError("A user from CachedModelBackend has no password hash; save a user loaded from the database.")
+    super().save(*args, **kwargs)
+    self._invalidate_on_commit(self.username, getattr(self, "_loaded_username", None))
+    self._loaded_username = self.username
+
+  def delete(self, *args, **kwargs):
+    username, pk, using = self.username, self.pk, self._state.db
+    result = super().delete(*args, **kwargs)
+    self._invalidate_on_commit(username, pk=pk, using=using)
+    return result
+
+  def _invalidate_on_commit(self, *usernames, pk=None, using=None):
+    """ Drop the cached copies once the change is committed; dropped any
+    earlier, a concurrent read could cache the old row again. """
+    pk = self.pk if pk is None else pk
+
+    def invalidate():
+      invalidate_profile(*usernames)
+      invalidate_auth_user(pk)
+
+    transaction.on_commit(invalidate, using=using or self._state.db)
+
+  @property
+  def avatar_url(self):
+    return avatar_url(self.avatar)
+
+  @property
+  def avatar_srcset(self):
+    """ The avatar at 1x and 2x, for <img srcset>. """
+    if not self.avatar:
+      return ""
+    return "%s 1x, %s 2x" % (self.avatar_url, avatar_url(self.avatar, 2 * DISPLAY_SIZE))
 
   def get_absolute_url(self):
     return reverse("user:detail", kwargs={ "username": self.username })
@@ -15,3 +98,16 @@ class User(AbstractUser):
     return self.username
 
 
+
+class BackfillCheckpoint(models.Model):
+  """ How far a backfill has got, see users/backfills.py. """
+  name = models.CharField(max_length=100, primary_key=True)
+  last_pk = models.BigIntegerField(default=0)
+  rows_seen = models.BigIntegerField(default=0)
+  rows_changed = models.BigIntegerField(default=0)
+  started_at = models.DateTimeField(auto_now_add=True)
+  updated_at = models.DateTimeField(auto_now=True)
+  finished_at = models.DateTimeField(null=True, blank=True)
+
+  def __str__(self):
+    return self.name
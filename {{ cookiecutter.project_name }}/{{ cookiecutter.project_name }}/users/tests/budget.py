@@ -0,0 +1,80 @@
+"""
+Query budgets for view tests. Wrap the request under test in
+
+  with query_budget("user:detail GET"):
+    self.client.get(url)
+
+and the test fails when it runs more SQL queries, or spends more time in
+the database, than query_budgets.json allows. `manage.py query_budgets`
+runs the tests and lists what each budget currently uses.
+"""
+import json
+from contextlib import ContextDecorator
+from pathlib import Path
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+BASELINE_PATH = Path(__file__).with_name("query_budgets.json")
+
+# name -> {"queries": int, "db_ms": float}, the most each budget used in
+# this run. Read by the query_budgets command.
+measured = {}
+# Set by `query_budgets --update` to record without failing.
+enforce = True
+
+
+class QueryBudgetExceeded(AssertionError):
+  pass
+
+
+def load_baseline():
+  if not BASELINE_PATH.exists():
+    return {}
+  with open(BASELINE_PATH) as fh:
+    return json.load(fh)
+
+
+class query_budget(ContextDecorator):
+
+  def __init__(self, name):
+    self.name = name
+
+  def __enter__(self):
+    self.context = CaptureQueriesContext(connection)
+    self.context.__enter__()
+    return self.context
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.context.__exit__(exc_type, exc_value, traceback)
+    if exc_type is not None:
+      return False
+
+    queries = self.context.captured_queries
+    db_ms = 1000 * sum(float(query["time"]) for query in queries)
+    record(self.name, len(queries), db_ms)
+    if not enforce:
+      return False
+
+    budget = load_baseline().get(self.name)
+    if budget is None:
+      raise QueryBudgetExceeded(
+        "No budget for %r in %s; run `manage.py query_budgets --update`."
+        % (self.name, BASELINE_PATH.name)
+      )
+    if len(queries) > budget["queries"]:
+      raise QueryBudgetExceeded("%s ran %s queries, the budget is %s:\n%s" % (
+        self.name, len(queries), budget["queries"],
+        "\n".join("  %s" % query["sql"] for query in queries),
+      ))
+    if db_ms > budget["db_ms"]:
+      raise QueryBudgetExceeded("%s spent %.1f ms in the database, the budget is %s ms." % (
+        self.name, db_ms, budget["db_ms"],
+      ))
+    return False
+
+
+def record(name, queries, db_ms):
+  current = measured.setdefault(name, {"queries": 0, "db_ms": 0.0})
+  current["queries"] = max(current["queries"], queries)
+  current["db_ms"] = max(current["db_ms"], db_ms)
@@ -0,0 +1,83 @@
+from unittest import mock
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.functions import Lower
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from {{ cookiecutter.project_name }}.users.admin import UserAdmin
+from {{ cookiecutter.project_name }}.users.cache import get_profile
+from {{ cookiecutter.project_name }}.users.models import User
+
+
+class UserAdminTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.admin = User.objects.create_superuser(username="admin", email="admin@test.com", password="pw")
+    User.objects.bulk_create([
+      User(username="user%s" % i, email="user%s@test.com" % i) for i in range(5)
+    ])
+    cls.url = reverse('admin:users_user_changelist')
+
+  def setUp(self):
+    cache.clear()
+    self.client.force_login(self.admin)
+
+  def usernames(self, response):
+    return [user.username for user in response.context['cl'].result_list]
+
+  @mock.patch.object(UserAdmin, "list_per_page", 2)
+  def test_keyset_pagination(self):
+    """ Ensures pages follow each other by primary key, newest first,
+    without OFFSET. """
+    first = self.client.get(self.url)
+    self.assertEqual(self.usernames(first), ["user4", "user3"])
+    self.assertContains(first, "about 6 users")
+    self.assertNotContains(first, "first page")
+
+    with CaptureQueriesContext(connection) as queries:
+      second = self.client.get(self.url + first.context['cl'].next_page_url)
+    self.assertFalse(any("OFFSET" in query["sql"] for query in queries))
+    self.assertEqual(self.usernames(second), ["user2", "user1"])
+    self.assertContains(second, "first page")
+
+    last = self.client.get(self.url + second.context['cl'].next_page_url)
+    self.assertEqual(self.usernames(last), ["user0", "admin"])
+    self.assertIsNone(last.context['cl'].next_page_url)
+
+  def test_prefix_search(self):
+    """ Ensures search matches the start of usernames and emails only,
+    ignoring case. """
+    response = self.client.get(self.url, {"q": "USER1"})
+    self.assertEqual(self.usernames(response), ["user1"])
+    response = self.client.get(self.url, {"q": "admin@"})
+    self.assertEqual(self.usernames(response), ["admin"])
+    response = self.client.get(self.url, {"q": "ser"})
+    self.assertEqual(self.usernames(response), [])
+
+  def test_prefix_search_uses_index(self):
+    queryset = User.objects.alias(username_lower=Lower('username')).filter(username_lower__startswith="user1")
+    with connection.cursor() as cursor:
+      cursor.execute("SET LOCAL enable_seqscan = off")
+    self.assertIn("users_user_username_lower_prefix", queryset.explain())
+
+  def test_deactivate_action(self):
+    """ Ensures the selected users are deactivated with one UPDATE, except
+    the admin doing it, and that their cached profiles are dropped. """
+    self.assertIsNotNone(get_profile("user1"))
+    pks = list(User.objects.filter(username__in=["user1", "user2", "admin"]).values_list("pk", flat=True))
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.post(self.url, {"action": "deactivate", ACTION_CHECKBOX_NAME: pks})
+    self.assertRedirects(response, self.url, fetch_redirect_response=False)
+    updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+    self.assertEqual(len(updates), 1)
+    self.assertEqual(
+      set(User.objects.filter(is_active=False).values_list("username", flat=True)), {"user1", "user2"},
+    )
+    self.assertIsNone(get_profile("user1"))
+
+    response = self.client.post(self.url, {"action": "activate", ACTION_CHECKBOX_NAME: pks}, follow=True)
+    self.assertContains(response, "Activated 2 users.")
+    self.assertFalse(User.objects.filter(is_active=False).exists())
@@ -0,0 +1,133 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from {{ cookiecutter.project_name }}.users.avatars import AVATAR_SIZES, avatar_storage, get_executor, save_avatar, variant_name
+from {{ cookiecutter.project_name }}.users.models import User
+
+
+def make_image(size=(400, 300), image_format="PNG"):
+  out = io.BytesIO()
+  mode = "RGBA" if image_format == "PNG" else "RGB"
+  Image.new(mode, size, (200, 40, 40, 128)[:len(mode)]).save(out, image_format)
+  return out.getvalue()
+
+
+class MediaRootMixin:
+
+  def setUp(self):
+    super().setUp()
+    cache.clear()
+    media_root = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, media_root)
+    settings = override_settings(MEDIA_ROOT=media_root)
+    settings.enable()
+    self.addCleanup(settings.disable)
+
+  def stored_files(self):
+    return sorted(
+      name for directory, _, names in os.walk(avatar_storage.location) for name in names
+    )
+
+
+@override_settings(AVATAR_WORKERS=0)
+class AvatarViewTest(MediaRootMixin, TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.user = User.objects.create_user(username="anon", email="anon@test.com")
+    cls.url = reverse('user:avatar', kwargs={"username": cls.user})
+
+  def upload(self, data, name="avatar.png", client=None):
+    client = client or self.client
+    client.force_login(self.user)
+    return client.post(self.url, {"avatar": SimpleUploadedFile(name, data)})
+
+  def test_POST(self):
+    """ Ensures the upload is stored under its hash with a square JPEG for
+    each size, and that the profile page shows it. """
+    data = make_image()
+    response = self.upload(data)
+    self.assertRedirects(response, reverse('user:detail', kwargs={"username": self.user}))
+    self.user.refresh_from_db()
+    digest = hashlib.sha256(data).hexdigest()
+    self.assertEqual(self.user.avatar, digest)
+    for size in AVATAR_SIZES:
+      with avatar_storage.open(variant_name(digest, size)) as fh, Image.open(fh) as image:
+        self.assertEqual((image.format, image.size), ("JPEG", (size, size)))
+
+    response = self.client.get(reverse('user:detail', kwargs={"username": self.user}))
+    self.assertContains(response, 'src="/media/avatars/%s/%s-160.jpg"' % (digest[:2], digest))
+    self.assertContains(response, "%s-320.jpg 2x" % digest)
+
+  def test_POST_same_image_twice(self):
+    """ Ensures an image that is already stored isn't stored again. """
+    data = make_image()
+    self.upload(data)
+    files = self.stored_files()
+    self.assertEqual(len(files), 1 + len(AVATAR_SIZES))
+    self.upload(data, name="copy.png")
+    self.assertEqual(self.stored_files(), files)
+
+  def test_POST_not_an_image(self):
+    response = self.upload(b"not an image", name="avatar.png")
+    self.assertEqual(response.context['form']['avatar'].errors, ["Upload a JPEG, PNG, GIF or WebP image."])
+    self.assertEqual(self.stored_files(), [])
+
+  @override_settings(AVATAR_MAX_UPLOAD_SIZE=1024 * 1024)
+  def test_POST_too_large(self):
+    response = self.upload(make_image() + b"\0" * 1024 * 1024)
+    self.assertEqual(response.context['form']['avatar'].errors, ["Avatars can be at most 1 MB."])
+
+  def test_POST_checks_csrf(self):
+    """ The view checks CSRF itself, see UserAvatarView.post(). """
+    response = self.upload(make_image(), client=Client(enforce_csrf_checks=True))
+    self.assertEqual(response.status_code, 403)
+
+
+@override_settings(AVATAR_WORKERS=1)
+class AvatarWorkerTest(MediaRootMixin, TransactionTestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.user = User.objects.create_user(username="anon", email="anon@test.com")
+    data = make_image((50, 80), "JPEG")
+    self.upload = TemporaryUploadedFile("avatar.jpg", "image/jpeg", len(data), None)
+    self.addCleanup(self.upload.close)
+    self.upload.write(data)
+    self.upload.sha256, self.upload.image_format = hashlib.sha256(data).hexdigest(), "JPEG"
+
+  def assertSaved(self, digest):
+    self.user.refresh_from_db()
+    self.assertEqual(self.user.avatar, digest)
+    self.assertEqual(len(self.stored_files()), 1 + len(AVATAR_SIZES))
+
+  def test_resizes_in_process_pool(self):
+    """ Ensures the avatar is only set once the pool has made its
+    variants. Needs committed data, since the pool's thread has its own
+    connection. """
+    self.assertSaved(save_avatar(self.user, self.upload).result(timeout=60))
+
+  def test_replaces_broken_pool(self):
+    """ Ensures a worker dying doesn't break uploads for the rest of the
+    process's life. """
+    with self.assertRaises(BrokenProcessPool):
+      get_executor().submit(os._exit, 1).result(timeout=60)
+    with self.assertLogs("{{ cookiecutter.project_name }}.users.avatars", "WARNING"):
+      done = save_avatar(self.user, self.upload)
+    self.assertSaved(done.result(timeout=60))
+
+  def test_resizes_in_request_without_pool(self):
+    with mock.patch("{{ cookiecutter.project_name }}.users.avatars.submit_render", side_effect=BrokenProcessPool), \
+         self.assertLogs("{{ cookiecutter.project_name }}.users.avatars", "ERROR"):
+      done = save_avatar(self.user, self.upload)
+    self.assertTrue(done.done())
+    self.assertSaved(done.result())
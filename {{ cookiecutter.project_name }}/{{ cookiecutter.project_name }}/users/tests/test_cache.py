@@ -0,0 +1,146 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from {{ cookiecutter.project_name }}.users.cache import auth_user_cache_key, get_profile, get_stats
+from {{ cookiecutter.project_name }}.users.models import User
+
+
+class ProfileCacheTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.user = User.objects.create_user(username="anon", email="anon@test.com")
+
+  def setUp(self):
+    cache.clear()
+
+  def test_read_through(self):
+    """ Ensures the first lookup is a miss that hits the database and the
+    second one is served from the cache. """
+    with self.assertNumQueries(1):
+      self.assertEqual(get_profile("anon"), self.user)
+    with self.assertNumQueries(0):
+      self.assertEqual(get_profile("anon"), self.user)
+    self.assertEqual(get_stats()["hits"], 1)
+    self.assertEqual(get_stats()["misses"], 1)
+
+  def test_non_existent_user(self):
+    """ Ensures None is returned, and not cached, for unknown usernames. """
+    self.assertIsNone(get_profile("sdf"))
+    User.objects.create_user(username="sdf", email="sdf@test.com")
+    self.assertIsNotNone(get_profile("sdf"))
+
+  def test_save_invalidates(self):
+    """ Ensures saving a user drops the cached profile. """
+    get_profile("anon")
+    self.user.first_name = "changed"
+    with self.captureOnCommitCallbacks(execute=True):
+      self.user.save()
+    self.assertEqual(get_profile("anon").first_name, "changed")
+
+  def test_invalidates_on_commit(self):
+    """ Ensures the cached profile is only dropped once the change is
+    committed, so a read during the transaction can't cache the old row
+    again after it was dropped. """
+    get_profile("anon")
+    self.user.first_name = "changed"
+    with self.captureOnCommitCallbacks() as callbacks:
+      self.user.save()
+      self.assertEqual(get_profile("anon").first_name, "")
+    for callback in callbacks:
+      callback()
+    self.assertEqual(get_profile("anon").first_name, "changed")
+
+  def test_rename_invalidates_old_username(self):
+    """ Ensures the old username stops resolving after a rename. """
+    user = User.objects.get(username="anon")
+    get_profile("anon")
+    user.username = "renamed"
+    with self.captureOnCommitCallbacks(execute=True):
+      user.save()
+    self.assertIsNone(get_profile("anon"))
+
+  def test_detail_view_uses_cache(self):
+    """ Ensures a repeated profile view does not query the database, and
+    that an update through UserUpdateView shows up immediately. """
+    url = reverse('user:detail', kwargs={"username": self.user})
+    self.client.get(url)
+    with self.assertNumQueries(0):
+      self.client.get(url)
+
+    self.client.force_login(self.user)
+    with self.captureOnCommitCallbacks(execute=True):
+      self.client.post(reverse('user:update_account', kwargs={"username": self.user}), {
+        "first_name": "updated",
+        "last_name": "nymous",
+        "email": "anon@test.com",
+      })
+    response = self.client.get(url)
+    self.assertEqual(response.context['object'].first_name, 'updated')
+
+  def test_soft_delete_invalidates(self):
+    """ Ensures a profile is gone right after UserDeleteView soft deletes it. """
+    url = reverse('user:detail', kwargs={"username": self.user})
+    self.client.get(url)
+    self.client.force_login(self.user)
+    with self.captureOnCommitCallbacks(execute=True):
+      self.client.get(reverse('user:delete_account', kwargs={"username": self.user}))
+    self.client.logout()
+    self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class AuthUserCacheTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.user = User.objects.create_user(username="anon", email="anon@test.com", password="pw")
+    cls.url = reverse('user:redirect')
+
+  def setUp(self):
+    cache.clear()
+    self.client.force_login(self.user)
+    # Load the user into the cache.
+    self.client.get(self.url)
+
+  def test_password_change_logs_out_other_sessions(self):
+    """ Ensures a session from before a password change is rejected, even
+    though its user was cached. """
+    other = Client()
+    other.force_login(self.user)
+    other.get(self.url)
+    with self.captureOnCommitCallbacks(execute=True):
+      response = self.client.post(reverse('user:password_change', kwargs={"username": "anon"}), {
+        'old_password': 'pw', 'new_password1': 'newpw', 'new_password2': 'newpw',
+      })
+    self.assertEqual(response.status_code, 302)
+    # This session was updated with the new hash.
+    self.assertEqual(self.client.get(self.url).url, reverse('user:detail', kwargs={"username": "anon"}))
+    self.assertEqual(other.get(self.url).url, reverse('user:login') + '?next=' + self.url)
+
+  def test_update_account_invalidates(self):
+    with self.captureOnCommitCallbacks(execute=True):
+      self.client.post(reverse('user:update_account', kwargs={"username": "anon"}), {
+        "first_name": "new", "last_name": "nymous", "email": "anon@test.com",
+      })
+    with self.assertNumQueries(2):
+      # The session and the user, which is cached again afterwards.
+      self.assertEqual(self.client.get(self.url).wsgi_request.user.first_name, "new")
+
+  def test_cached_without_password(self):
+    """ Ensures the shared cache never holds the password hash, and that a
+    password change still works with the cached user. """
+    cached = cache.get(auth_user_cache_key(self.user.pk))
+    self.assertIsNone(cached.password)
+    self.assertEqual(cached.get_session_auth_hash(), User.objects.get(pk=self.user.pk).get_session_auth_hash())
+    with self.assertRaises(ValueError):
+      cached.save()
+    response = self.client.post(reverse('user:password_change', kwargs={"username": "anon"}), {
+      'old_password': 'pw', 'new_password1': 'newpw', 'new_password2': 'newpw',
+    })
+    self.assertEqual(response.status_code, 302)
+    self.assertTrue(User.objects.get(pk=self.user.pk).check_password('newpw'))
+
+  def test_soft_delete_logs_out(self):
+    with self.captureOnCommitCallbacks(execute=True):
+      self.client.get(reverse('user:delete_account', kwargs={"username": "anon"}))
+    self.assertFalse(self.client.get(self.url).wsgi_request.user.is_authenticated)
@@ -0,0 +1,222 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from {{ cookiecutter.project_name }}.users.backfills import LowercaseUsernamesAndEmails
+from {{ cookiecutter.project_name }}.users.cache import get_profile
+from {{ cookiecutter.project_name }}.users.models import BackfillCheckpoint, User
+
+
+class ImportExportUsersTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.user = User.objects.create_user(username="anon", email="anon@test.com", password="pw")
+
+  def write_file(self, suffix, content):
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, "w") as fh:
+      fh.write(content)
+    self.addCleanup(os.remove, path)
+    return path
+
+  def import_users(self, *args):
+    stdout, stderr = StringIO(), StringIO()
+    call_command("import_users", *args, stdout=stdout, stderr=stderr)
+    return stdout.getvalue(), stderr.getvalue()
+
+  def test_import_csv(self):
+    """ Ensures valid rows are imported in batches while failing rows are
+    reported with their line number. """
+    path = self.write_file(".csv", (
+      "username,email,first_name,last_name,password\n"
+      "New1,New1@test.com,new,one,pw1\n"
+      "anon,other@test.com,dup,licate,pw\n"
+      "new2,not-an-email,new,two,pw2\n"
+      "new3,new3@test.com,new,three,pw3\n"
+    ))
+    stdout, stderr = self.import_users(path, "--batch-size", "2", "--workers", "0")
+    self.assertIn("Imported 2 users, 2 rows failed.", stdout)
+    self.assertIn("line 3: Username has already been taken.", stderr)
+    self.assertIn("line 4: email:", stderr)
+    new1 = User.objects.get(username="new1")
+    self.assertEqual(new1.email, "new1@test.com")
+    self.assertTrue(new1.check_password("pw1"))
+    self.assertTrue(User.objects.filter(username="new3").exists())
+
+  def test_import_jsonl_with_process_pool(self):
+    """ Ensures passwords hashed in worker processes are usable. """
+    path = self.write_file(".jsonl", (
+      json.dumps({"username": "new1", "email": "new1@test.com", "first_name": "new", "last_name": "one", "password": "pw1"}) + "\n"
+      "not json\n"
+    ))
+    stdout, stderr = self.import_users(path, "--workers", "2")
+    self.assertIn("Imported 1 users, 1 rows failed.", stdout)
+    self.assertIn("line 2: invalid JSON", stderr)
+    self.assertTrue(User.objects.get(username="new1").check_password("pw1"))
+
+  def test_export_and_reimport_hashed(self):
+    """ Ensures an export can be imported elsewhere with --hashed, keeping
+    the password hashes as they are. """
+    out = StringIO()
+    call_command("export_users", "--format", "jsonl", stdout=out)
+    record = json.loads(out.getvalue().splitlines()[0])
+    self.assertEqual(record["username"], "anon")
+    self.assertEqual(record["password"], self.user.password)
+
+    User.objects.all().delete()
+    path = self.write_file(".jsonl", out.getvalue())
+    stdout, stderr = self.import_users(path, "--hashed")
+    self.assertIn("Imported 1 users, 0 rows failed.", stdout)
+    self.assertTrue(User.objects.get(username="anon").check_password("pw"))
+
+  def test_import_hashed_rejects_raw_password(self):
+    path = self.write_file(".csv", "username,email,first_name,last_name,password\nnew1,new1@test.com,new,one,plain\n")
+    stdout, stderr = self.import_users(path, "--hashed")
+    self.assertIn("line 2: password: not a recognised password hash", stderr)
+    self.assertFalse(User.objects.filter(username="new1").exists())
+
+
+class BenchmarkHashersTest(TestCase):
+
+  def test_reports_each_hasher(self):
+    out = StringIO()
+    call_command("benchmark_hashers", "--seconds", "0.01", stdout=out)
+    self.assertIn("hashes/s", out.getvalue())
+    self.assertIn("TunedArgon2PasswordHasher", out.getvalue())
+    self.assertIn("PBKDF2PasswordHasher", out.getvalue())
+
+
+class PurgeSessionsTest(TestCase):
+
+  def test_deletes_only_expired_sessions(self):
+    """ Ensures expired sessions are deleted over several chunks and live
+    ones are kept. """
+    now = timezone.now()
+    for i in range(5):
+      Session.objects.create(session_key="expired%s" % i, session_data="", expire_date=now - timedelta(days=1))
+    Session.objects.create(session_key="live", session_data="", expire_date=now + timedelta(days=1))
+    out = StringIO()
+    call_command("purge_sessions", "--chunk-size", "2", stdout=out)
+    self.assertIn("Deleted 5 expired sessions.", out.getvalue())
+    self.assertQuerysetEqual(Session.objects.values_list("session_key", flat=True), ["live"], transform=str)
+
+
+class BenchTest(TransactionTestCase):
+
+  def test_runs_scenarios_and_cleans_up(self):
+    """ Ensures every scenario succeeds, results are saved as JSON and the
+    seeded users are removed. Worker threads use their own connections, so
+    this needs committed data. """
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    self.addCleanup(os.remove, path)
+    out = StringIO()
+    call_command(
+      "bench", "--users", "2", "--requests", "2", "--concurrency", "2", "--host", "localhost",
+      "--output", path, stdout=out,
+    )
+    with open(path) as fh:
+      results = json.load(fh)
+    self.assertEqual(
+      sorted(results["scenarios"]),
+      ["change-password", "detail", "login", "register", "update-account"],
+    )
+    for scenario, result in results["scenarios"].items():
+      self.assertEqual(result["errors"], 0, scenario)
+    self.assertFalse(User.objects.exists())
+
+  def test_more_requests_than_users(self):
+    """ Ensures a password change doesn't log out the clients of later
+    requests for the same user, whose redirects to the login page would
+    count as errors. """
+    out = StringIO()
+    with tempfile.TemporaryDirectory() as directory:
+      call_command(
+        "bench", "--users", "2", "--requests", "4", "--concurrency", "2",
+        "--scenarios", "update-account", "change-password",
+        "--output", os.path.join(directory, "results.json"), stdout=out,
+      )
+      with open(os.path.join(directory, "results.json")) as fh:
+        results = json.load(fh)
+    for scenario, result in results["scenarios"].items():
+      self.assertEqual(result["errors"], 0, scenario)
+    self.assertFalse(User.objects.exists())
+
+
+class StartupProfileTest(TestCase):
+
+  def test_reports_setup_ready_and_imports(self):
+    """ Ensures a fresh interpreter is profiled with these settings. """
+    out = StringIO()
+    call_command("startup_profile", "--limit", "3", "--sort", "self", stdout=out)
+    output = out.getvalue()
+    self.assertIn("ms to set up Django", output)
+    self.assertIn("\nusers ", output)
+    self.assertIn("\ndjango ", output)
+    self.assertEqual(len(output.split("cumulative ms\n")[1].splitlines()), 3)
+
+
+class BackfillTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    User.objects.bulk_create([
+      User(username="Upper%s" % i, email="Upper%s@Test.com" % i) for i in range(4)
+    ] + [User(username="lower", email="lower@test.com")])
+
+  def setUp(self):
+    cache.clear()
+    self.addCleanup(cache.clear)
+
+  def backfill(self, *args):
+    out = StringIO()
+    call_command("backfill", "lowercase_usernames_emails", "--pause", "0", *args, stdout=out)
+    return out.getvalue()
+
+  def test_lowercase_usernames_emails(self):
+    """ Ensures capitals are lowercased chunk by chunk and the old cached
+    profiles are dropped once each chunk commits. """
+    self.assertIsNotNone(get_profile("Upper1"))
+    with self.captureOnCommitCallbacks(execute=True) as callbacks:
+      output = self.backfill("--chunk-size", "2")
+    self.assertEqual(len(callbacks), 3)
+    self.assertIn("5 rows, 4 changed.", output)
+    self.assertEqual(
+      sorted(User.objects.values_list("username", "email")),
+      [("lower", "lower@test.com")] + [("upper%s" % i, "upper%s@test.com" % i) for i in range(4)],
+    )
+    self.assertIsNone(get_profile("Upper1"))
+    # A finished backfill doesn't run again.
+    with self.assertNumQueries(1):
+      self.assertIn("5 rows, 4 changed.", self.backfill())
+
+  def test_resumes_after_interruption(self):
+    """ Ensures an interrupted backfill keeps its committed chunks and
+    carries on after the last one. """
+    process = LowercaseUsernamesAndEmails.process
+    calls = []
+
+    def interrupt(backfill, pks):
+      calls.append(pks)
+      if len(calls) == 2:
+        raise KeyboardInterrupt
+      return process(backfill, pks)
+
+    with mock.patch.object(LowercaseUsernamesAndEmails, "process", interrupt):
+      with self.assertRaisesMessage(CommandError, "Interrupted"):
+        self.backfill("--chunk-size", "2")
+    checkpoint = BackfillCheckpoint.objects.get()
+    self.assertEqual((checkpoint.last_pk, checkpoint.rows_changed), (calls[0][-1], 2))
+    self.assertEqual(User.objects.filter(username__startswith="upper").count(), 2)
+
+    self.assertIn("5 rows, 4 changed.", self.backfill("--chunk-size", "2"))
+    self.assertFalse(User.objects.filter(username__startswith="Upper").exists())
+    self.assertIn("5 rows, 0 changed.", self.backfill("--restart"))
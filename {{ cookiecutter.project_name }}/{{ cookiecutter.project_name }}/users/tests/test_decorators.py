@@ -0,0 +1,70 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from {{ cookiecutter.project_name }}.users.decorators import cache_page_for_anonymous
+from {{ cookiecutter.project_name }}.users.models import User
+from {{ cookiecutter.project_name }}.users.views import AsyncTemplateView
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=60)
+class CachePageForAnonymousTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.user = User.objects.create_user(username="anon", email="anon@test.com")
+    cls.url = reverse('about')
+
+  def setUp(self):
+    cache.clear()
+
+  def test_anonymous_GET_is_cached(self):
+    """ Ensures the second anonymous request is served without rendering,
+    and that browsers are told not to keep a copy. """
+    self.client.get(self.url)
+    response = self.client.get(self.url)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.templates, [])
+    self.assertIn('private', response['Cache-Control'])
+
+  def test_authorized_GET_is_not_cached(self):
+    """ Ensures logged in users get their own nav, not the cached page. """
+    self.client.get(self.url)
+    self.client.force_login(self.user)
+    response = self.client.get(self.url)
+    self.assertTemplateUsed(response, 'pages/about.html')
+    self.assertContains(response, 'current user')
+
+  def test_GET_with_messages_is_not_cached(self):
+    """ Ensures a page showing a message is neither served from nor put
+    in the cache. """
+    self.client.get(self.url)
+    self.client.force_login(self.user)
+    self.client.get(reverse('user:delete_account', kwargs={"username": self.user}))
+    response = self.client.get(self.url)
+    self.assertContains(response, 'User has been deleted.')
+    response = self.client.get(self.url)
+    self.assertNotContains(response, 'User has been deleted.')
+
+  @override_settings(PAGE_CACHE_TIMEOUT=0)
+  def test_disabled(self):
+    self.client.get(self.url)
+    response = self.client.get(self.url)
+    self.assertTemplateUsed(response, 'pages/about.html')
+
+  def test_async_view(self):
+    """ Ensures async views are cached the same way. """
+    view = async_to_sync(cache_page_for_anonymous(AsyncTemplateView.as_view(template_name="pages/about.html")))
+    rendered = []
+    for _ in range(2):
+      request = AsyncRequestFactory().get(self.url)
+      request.user = AnonymousUser()
+      request._messages = CookieStorage(request)
+      response = view(request)
+      # Responses from the cache come back already rendered.
+      rendered.append(response.is_rendered)
+      response.render()
+    self.assertEqual(rendered, [False, True])
+    self.assertIn('private', response['Cache-Control'])
@@ -15,7 +15,7 @@ class CreateUserFormTest(TestCase):
     self.assertEqual(len(form.fields), 6)
 
   def test_clean_username(self):
-    """ Ensure a ValidationError is raised if username already exist. """
+    """ Ensure a field error is added on save if username already exist. """
     form_data = {
       "username": "anon",
       "first_name": "anon",
@@ -25,11 +25,13 @@ class CreateUserFormTest(TestCase):
       "password2": "pw"
     }
     form = CreateUserForm(data=form_data)
+    self.assertTrue(form.is_valid())
+    self.assertIsNone(form.save())
     self.assertFalse(form.is_valid())
     self.assertEqual(form['username'].errors, ['Username has already been taken.'])
 
   def test_clean_email(self):
-    """ Ensure a ValidationError is raised if email already exist. """
+    """ Ensure a field error is added on save if email already exist. """
     form_data = {
       "username": "anon2",
       "first_name": "anon",
@@ -39,9 +41,43 @@ class CreateUserFormTest(TestCase):
       "password2": "pw"
     }
     form = CreateUserForm(data=form_data)
+    self.assertTrue(form.is_valid())
+    self.assertIsNone(form.save())
     self.assertFalse(form.is_valid())
     self.assertEqual(form['email'].errors, ['Email has already been taken.'])
 
+  def test_case_insensitive_uniqueness(self):
+    """ Ensure mixed-case rows still block their lowercase duplicates. """
+    User.objects.create_user(username="MixedCase", email="Mixed@Test.com")
+    form = CreateUserForm(data={
+      "username": "mixedcase",
+      "first_name": "anon",
+      "last_name": "nymous",
+      "email": "mixed@test.com",
+      "password1": "pw",
+      "password2": "pw"
+    })
+    self.assertTrue(form.is_valid())
+    self.assertIsNone(form.save())
+    self.assertEqual(form['username'].errors, ['Username has already been taken.'])
+
+  def test_no_uniqueness_queries(self):
+    """ Ensure validation does not query for duplicates, and that saving
+    costs a single INSERT. """
+    form = CreateUserForm(data={
+      "username": "new",
+      "first_name": "anon",
+      "last_name": "nymous",
+      "email": "new@test.com",
+      "password1": "pw",
+      "password2": "pw"
+    })
+    with self.assertNumQueries(0):
+      self.assertTrue(form.is_valid())
+    # savepoint, INSERT, release
+    with self.assertNumQueries(3):
+      self.assertIsNotNone(form.save())
+
 
 class UpdateUserFormTest(TestCase):
 
@@ -61,6 +97,8 @@ class UpdateUserFormTest(TestCase):
     self.assertTrue(form.is_valid())
     # providing email that already exist (user2.email)
     form = UpdateUserForm(instance=self.user, data={"email": "anon2@test.com", "first_name": "anon", "last_name": "nymous"})
+    self.assertTrue(form.is_valid())
+    self.assertIsNone(form.save())
     self.assertFalse(form.is_valid())
     self.assertEqual(form['email'].errors, ['Email has already been taken.'])
     # provide email that doesn't exist
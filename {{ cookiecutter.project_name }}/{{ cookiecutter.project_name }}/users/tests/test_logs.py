@@ -0,0 +1,59 @@
+import json
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from config.logs import JsonFormatter, RequestIDFilter
+from {{ cookiecutter.project_name }}.users.models import User
+
+MIDDLEWARE = list(settings.MIDDLEWARE)
+MIDDLEWARE.insert(MIDDLEWARE.index('config.metrics.TimingMiddleware') + 1, 'config.logs.RequestLogMiddleware')
+
+
+@override_settings(MIDDLEWARE=MIDDLEWARE, SLOW_QUERY_MS=0)
+class RequestLogTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.user = User.objects.create_user(username="anon", email="anon@test.com")
+    cls.url = reverse('user:detail', kwargs={"username": cls.user})
+
+  def setUp(self):
+    cache.clear()
+    for name in ("config.requests", "config.slow_queries"):
+      request_id = RequestIDFilter()
+      logging.getLogger(name).addFilter(request_id)
+      self.addCleanup(logging.getLogger(name).removeFilter, request_id)
+
+  def test_request_log(self):
+    """ Ensures each request is logged once with its ID, which is also
+    returned to the client. """
+    with self.assertLogs("config.requests", "INFO") as logs:
+      response = self.client.get(self.url)
+    [record] = logs.records
+    self.assertEqual(record.request_id, response["X-Request-ID"])
+    self.assertEqual((record.status, record.view, record.queries), (200, "user:detail", 1))
+
+  def test_request_id_from_header(self):
+    response = self.client.get(self.url, HTTP_X_REQUEST_ID="abc-123")
+    self.assertEqual(response["X-Request-ID"], "abc-123")
+    response = self.client.get(self.url, HTTP_X_REQUEST_ID="no spaces\n")
+    self.assertRegex(response["X-Request-ID"], "^[0-9a-f]{32}$")
+
+  @override_settings(SLOW_QUERY_MS=0.001)
+  def test_slow_query_log(self):
+    """ Ensures slow queries are logged with their plan, view and the
+    request ID. """
+    with self.assertLogs("config.slow_queries", "WARNING") as logs:
+      response = self.client.get(self.url, HTTP_X_REQUEST_ID="abc-123")
+    self.assertEqual(response.status_code, 200)
+    [record] = logs.records
+    self.assertEqual(record.view, "user:detail")
+    self.assertIn('FROM "users_user"', record.sql)
+    self.assertIn("Scan", record.plan)
+
+    logged = json.loads(JsonFormatter().format(record))
+    self.assertEqual(logged["request_id"], "abc-123")
+    self.assertEqual(logged["level"], "WARNING")
+    self.assertEqual(logged["plan"], record.plan)
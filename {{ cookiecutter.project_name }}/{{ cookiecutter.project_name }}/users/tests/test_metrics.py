@@ -0,0 +1,116 @@
+import asyncio
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from config.clientip import client_ip
+from config.db.router import ReplicaStickinessMiddleware
+from config.logs import RequestLogMiddleware
+from config.metrics import TimingMiddleware, registry, render_metrics, sample
+from config.staticfiles import StaticFilesMiddleware
+from {{ cookiecutter.project_name }}.users.models import User
+
+
+class MetricsTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.user = User.objects.create_user(username="anon", email="anon@test.com")
+
+  def setUp(self):
+    cache.clear()
+    registry._views.clear()
+
+  def test_server_timing(self):
+    response = self.client.get(reverse('user:detail', kwargs={"username": self.user}))
+    self.assertRegex(
+      response["Server-Timing"],
+      r'^db;dur=[0-9.]+;desc="1 queries", tpl;dur=[0-9.]+, total;dur=[0-9.]+$',
+    )
+
+  def test_render_metrics(self):
+    """ Ensures each view gets a cumulative histogram with its sum and
+    count, plus the database and template totals. """
+    registry.observe("user:detail", "GET", 0.02, 0.005, 1, 0.01)
+    registry.observe("user:detail", "GET", 3.0, 0.5, 2, 0.1)
+    lines = render_metrics().splitlines()
+    bucket = 'django_request_duration_seconds_bucket{view="user:detail",method="GET",le="%s"} %s'
+    for le, count in (("0.01", 0), ("0.025", 1), ("2.5", 1), ("5.0", 2), ("+Inf", 2)):
+      self.assertIn(bucket % (le, count), lines)
+    self.assertIn('django_request_duration_seconds_count{view="user:detail",method="GET"} 2', lines)
+    self.assertIn('django_request_db_queries_total{view="user:detail",method="GET"} 3', lines)
+    self.assertIn("# TYPE django_request_duration_seconds histogram", lines)
+
+  def test_label_escaping(self):
+    self.assertEqual(sample("m", 1, view='a"b\\c\n'), 'm{view="a\\"b\\\\c\\n"} 1')
+
+  def test_metrics_view(self):
+    """ Ensures requests show up in the scrape, which only allowed
+    clients may make. """
+    self.client.get(reverse('user:detail', kwargs={"username": self.user}))
+    response = self.client.get(reverse('metrics'))
+    self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+    self.assertContains(response, 'django_request_duration_seconds_count{view="user:detail",method="GET"} 1')
+    self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR="10.0.0.9").status_code, 404)
+
+  @override_settings(TRUSTED_PROXIES=["10.0.0.0/8"])
+  def test_metrics_view_behind_proxy(self):
+    """ Ensures the scraper's address is read from the proxy's header,
+    not taken from the proxy itself. """
+    url = reverse('metrics')
+    self.assertEqual(self.client.get(url, REMOTE_ADDR="10.0.0.9").status_code, 404)
+    response = self.client.get(url, REMOTE_ADDR="10.0.0.9", HTTP_X_FORWARDED_FOR="127.0.0.1")
+    self.assertEqual(response.status_code, 200)
+    response = self.client.get(url, REMOTE_ADDR="203.0.113.5", HTTP_X_FORWARDED_FOR="127.0.0.1")
+    self.assertEqual(response.status_code, 404)
+
+
+class ClientIPTest(SimpleTestCase):
+
+  def ip(self, remote_addr, forwarded_for=None):
+    headers = {} if forwarded_for is None else {"HTTP_X_FORWARDED_FOR": forwarded_for}
+    return client_ip(RequestFactory().get("/", REMOTE_ADDR=remote_addr, **headers))
+
+  def test_no_trusted_proxies(self):
+    self.assertEqual(self.ip("203.0.113.5", "198.51.100.1"), "203.0.113.5")
+
+  @override_settings(TRUSTED_PROXIES=["10.0.0.1", "192.168.0.0/16"])
+  def test_trusted_proxies(self):
+    """ Ensures addresses are taken from the right, so a client can't pick
+    its own by sending the header itself. """
+    self.assertEqual(self.ip("10.0.0.1", "198.51.100.1"), "198.51.100.1")
+    self.assertEqual(self.ip("10.0.0.1", "1.2.3.4, 198.51.100.1, 192.168.1.1"), "198.51.100.1")
+    self.assertEqual(self.ip("10.0.0.1", "192.168.1.1, 10.0.0.1"), "192.168.1.1")
+    self.assertEqual(self.ip("10.0.0.1"), "10.0.0.1")
+    self.assertEqual(self.ip("10.0.0.2", "198.51.100.1"), "10.0.0.2")
+
+  @override_settings(TRUSTED_PROXIES=["10.0.0.1"], CLIENT_IP_HEADER="X-Real-IP")
+  def test_header_setting(self):
+    request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.1", HTTP_X_REAL_IP="198.51.100.1")
+    self.assertEqual(client_ip(request), "198.51.100.1")
+
+
+class AsyncMiddlewareTest(TestCase):
+
+  async def get_response(self, request):
+    await sync_to_async(User.objects.count)()
+    return HttpResponse()
+
+  def test_async_capable(self):
+    """ Ensures the middleware stays async in an async stack, so it
+    doesn't cost ASGI requests a thread switch. """
+    for middleware in (TimingMiddleware, RequestLogMiddleware, ReplicaStickinessMiddleware, StaticFilesMiddleware):
+      self.assertTrue(asyncio.iscoroutinefunction(middleware(self.get_response)), middleware)
+      self.assertFalse(asyncio.iscoroutinefunction(middleware(lambda request: HttpResponse())), middleware)
+
+  def test_async_timing(self):
+    """ Ensures queries run by an async view are timed. """
+    response = async_to_sync(TimingMiddleware(self.get_response))(RequestFactory().get("/"))
+    self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+  @override_settings(SLOW_QUERY_MS=0.001)
+  def test_async_slow_query_log(self):
+    with self.assertLogs("config.slow_queries", "WARNING") as logs:
+      async_to_sync(RequestLogMiddleware(self.get_response))(RequestFactory().get("/"))
+    self.assertIn('FROM "users_user"', logs.records[0].sql)
@@ -0,0 +1,124 @@
+from io import StringIO
+from unittest import mock
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, migrations, models
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.state import ProjectState
+from django.test import TestCase, TransactionTestCase
+from config.db.operations import AddIndexConcurrently, SetNotNull
+from {{ cookiecutter.project_name }}.users.management.commands.lint_migrations import lint_migration
+
+
+class LintMigrationsTest(TestCase):
+
+  def lint(self, *operations, atomic=True):
+    migration = migrations.Migration("0099_test", "users")
+    migration.operations = list(operations)
+    migration.atomic = atomic
+    state = MigrationLoader(connection).project_state(("users", "0007_backfillcheckpoint"))
+    return [problem for operation, problem in lint_migration(migration, state, {("users", "user")}, connection)]
+
+  def test_flags_blocking_operations(self):
+    index = models.Index(fields=["first_name"], name="users_first_name_idx")
+    problems = self.lint(
+      migrations.AddIndex("user", index),
+      migrations.AlterField("user", "first_name", models.CharField(max_length=30, null=True)),
+      migrations.AlterField("user", "first_name", models.CharField(max_length=30)),
+      migrations.AlterField("user", "last_name", models.TextField()),
+      migrations.AddField("user", "nickname", models.CharField(max_length=30, default="", db_index=True)),
+      migrations.RunSQL('CREATE INDEX "x" ON "users_user" ("email");'),
+    )
+    self.assertEqual(len(problems), 5)
+    self.assertIn("use AddIndexConcurrently", problems[0])
+    self.assertIn("use SetNotNull", problems[1])
+    self.assertIn("rewrites the table", problems[2])
+    self.assertIn("CREATE INDEX CONCURRENTLY", problems[4])
+
+  def test_allows_safe_operations(self):
+    index = models.Index(fields=["first_name"], name="users_first_name_idx")
+    self.assertEqual(self.lint(
+      AddIndexConcurrently("user", index),
+      migrations.AddField("user", "nickname", models.CharField(max_length=30, default="")),
+      migrations.AlterField("user", "last_name", models.CharField(max_length=200, verbose_name="last name")),
+      migrations.AddIndex("backfillcheckpoint", models.Index(fields=["finished_at"], name="finished_idx")),
+      atomic=False,
+    ), [])
+    self.assertIn("atomic = False", self.lint(AddIndexConcurrently("user", index))[0])
+
+  def test_command(self):
+    """ Ensures the project's own migrations pass. """
+    out = StringIO()
+    call_command("lint_migrations", stdout=out)
+    self.assertIn("No blocking operations in 0 migrations.", out.getvalue())
+    out = StringIO()
+    call_command("lint_migrations", "--all", stdout=out)
+    self.assertRegex(out.getvalue(), r"No blocking operations in [1-9][0-9]* migrations\.")
+
+  def test_command_reports_problems(self):
+    """ Ensures each problem is listed and the command fails. """
+    migration = MigrationLoader(connection).graph.nodes[("users", "0003_user_active_partial_indexes")]
+    out = StringIO()
+    with mock.patch.object(type(migration), "atomic", True), \
+         self.assertRaisesMessage(CommandError, "2 blocking operations in 1 migrations."):
+      call_command("lint_migrations", "users", "0003", stdout=out)
+    self.assertIn("users.0003_user_active_partial_indexes: Concurrently create index users_active_username_idx", out.getvalue())
+
+
+class OperationsTest(TransactionTestCase):
+  """ Runs the operations on a scratch table, outside a transaction as
+  they would be in a migration with atomic = False. """
+
+  def setUp(self):
+    self.state = ProjectState()
+    create = migrations.CreateModel("Pet", [
+      ("id", models.AutoField(primary_key=True)),
+      ("name", models.CharField(max_length=30, null=True)),
+    ])
+    create.state_forwards("users", self.state)
+    with connection.schema_editor(atomic=False) as editor:
+      create.database_forwards("users", editor, ProjectState(), self.state)
+    self.addCleanup(self.drop_table)
+
+  def drop_table(self):
+    with connection.cursor() as cursor:
+      cursor.execute('DROP TABLE "users_pet"')
+
+  def apply(self, operation, backwards=False):
+    state = self.state.clone()
+    operation.state_forwards("users", state)
+    with connection.schema_editor(atomic=False) as editor:
+      if backwards:
+        operation.database_backwards("users", editor, state, self.state)
+      else:
+        operation.database_forwards("users", editor, self.state, state)
+
+  def insert(self, *names):
+    with connection.cursor() as cursor:
+      for name in names:
+        cursor.execute('INSERT INTO "users_pet" ("name") VALUES (%s)', [name])
+
+  def test_set_not_null(self):
+    """ Ensures the column only becomes NOT NULL once every row has a
+    value, and that a failed attempt can be run again. """
+    operation = SetNotNull("pet", "name", models.CharField(max_length=30))
+    self.insert("rex", None)
+    with self.assertRaises(IntegrityError):
+      self.apply(operation)
+    with connection.cursor() as cursor:
+      cursor.execute('UPDATE "users_pet" SET "name" = %s WHERE "name" IS NULL', ["tom"])
+    self.apply(operation)
+    with self.assertRaises(IntegrityError):
+      self.insert(None)
+    self.apply(operation, backwards=True)
+    self.insert(None)
+
+  def test_add_index_concurrently_after_failure(self):
+    """ Ensures an invalid index left by a failed concurrent build is
+    replaced. """
+    self.insert("rex", "rex")
+    with self.assertRaises(IntegrityError), connection.cursor() as cursor:
+      cursor.execute('CREATE UNIQUE INDEX CONCURRENTLY "users_pet_name_idx" ON "users_pet" ("name")')
+    self.apply(AddIndexConcurrently("pet", models.Index(fields=["name"], name="users_pet_name_idx")))
+    with connection.cursor() as cursor:
+      cursor.execute("SELECT indisvalid, indisunique FROM pg_index WHERE indexrelid = 'users_pet_name_idx'::regclass")
+      self.assertEqual(cursor.fetchone(), (True, False))
@@ -15,3 +15,22 @@ class UserModelTest(TestCase):
   def test_str_representation(self):
     self.assertTrue(self.user, "anon")
 
+
+class ActiveUserManagerTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.user = User.objects.create_user(username="anon", email="anon@test.com")
+    cls.inactive_user = User.objects.create_user(username="anon2", email="anon2@test.com", is_active=False)
+
+  def test_excludes_inactive_users(self):
+    self.assertEqual(list(User.active.all()), [self.user])
+    self.assertEqual(User.objects.count(), 2)
+
+  def test_public_profile(self):
+    """ Ensures only the columns rendered on the profile page, and the
+    updated_at its ETag is made from, are loaded. """
+    user = User.active.public_profile().get(username="anon")
+    self.assertEqual(user.get_deferred_fields(), {
+      field.attname for field in User._meta.concrete_fields
+    } - {"id", "username", "first_name", "last_name", "email", "avatar", "updated_at"})
@@ -0,0 +1,139 @@
+import threading
+from django.db import connection
+from django.db.utils import load_backend
+from django.test import SimpleTestCase
+from config.db.pool import ConnectionPool, PoolTimeout, close_idle_connections
+
+
+class FakeConnection:
+  closed = 0
+
+  def close(self):
+    self.closed = 1
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+  def test_reuses_released_connections(self):
+    pool = ConnectionPool(max_size=2)
+    conn = pool.acquire(FakeConnection)
+    self.assertEqual(pool.stats()["in_use"], 1)
+    pool.release(conn)
+    self.assertIs(pool.acquire(FakeConnection), conn)
+    self.assertEqual(pool.stats()["connections_created"], 1)
+
+  def test_check_replaces_stale_connection(self):
+    pool = ConnectionPool(max_size=1)
+    stale = pool.acquire(FakeConnection)
+    pool.release(stale)
+    conn = pool.acquire(FakeConnection, check=lambda conn: False)
+    self.assertIsNot(conn, stale)
+    self.assertTrue(stale.closed)
+    self.assertEqual(pool.stats()["connections_closed"], 1)
+
+  def test_discards_expired_connections(self):
+    pool = ConnectionPool(max_size=1, max_lifetime=0)
+    conn = pool.acquire(FakeConnection)
+    pool.release(conn)
+    self.assertTrue(conn.closed)
+    self.assertEqual(pool.stats()["idle"], 0)
+
+  def test_limit(self):
+    """ Ensures an exhausted pool makes callers wait for a release, and
+    times out when none comes. """
+    pool = ConnectionPool(max_size=1, timeout=0.05)
+    conn = pool.acquire(FakeConnection)
+    with self.assertRaises(PoolTimeout):
+      pool.acquire(FakeConnection)
+    self.assertEqual(pool.stats()["timeouts"], 1)
+
+    pool.timeout = 10
+    releaser = threading.Timer(0.05, pool.release, [conn])
+    releaser.start()
+    self.assertIs(pool.acquire(FakeConnection), conn)
+    releaser.join()
+    self.assertEqual(pool.stats()["in_use"], 1)
+
+  def test_failed_connect_frees_slot(self):
+    pool = ConnectionPool(max_size=1, timeout=0.05)
+
+    def connect():
+      raise OSError("refused")
+
+    with self.assertRaises(OSError):
+      pool.acquire(connect)
+    self.assertIsInstance(pool.acquire(FakeConnection), FakeConnection)
+
+
+class PooledBackendTest(SimpleTestCase):
+  """ Opens its own connections to the test database through the pooled
+  backend. """
+  databases = {'default'}
+
+  def wrapper(self, conn_max_age=0, **pool):
+    settings_dict = dict(
+      connection.settings_dict,
+      ENGINE='config.db.postgresql',
+      CONN_MAX_AGE=conn_max_age,
+      HEALTH_CHECKS=True,
+      POOL=dict({'MAX_SIZE': 1, 'TIMEOUT': 0.05}, **pool),
+    )
+    wrapper = load_backend('config.db.postgresql').DatabaseWrapper(settings_dict, alias=self.id())
+    self.addCleanup(wrapper.close)
+    return wrapper
+
+  def setUp(self):
+    self.addCleanup(close_idle_connections, connection.settings_dict['NAME'])
+
+  def backend_pid(self, wrapper):
+    with wrapper.cursor() as cursor:
+      cursor.execute("SELECT pg_backend_pid()")
+      return cursor.fetchone()[0]
+
+  def test_close_returns_connection(self):
+    wrapper = self.wrapper()
+    pid = self.backend_pid(wrapper)
+    wrapper.close()
+    self.assertEqual(wrapper.pool.stats()["idle"], 1)
+    self.assertEqual(self.backend_pid(wrapper), pid)
+
+  def test_close_rolls_back(self):
+    """ Ensures a connection goes back to the pool outside a transaction
+    and in autocommit mode. """
+    wrapper = self.wrapper()
+    wrapper.set_autocommit(False)
+    self.backend_pid(wrapper)
+    raw = wrapper.connection
+    wrapper.close()
+    self.assertTrue(raw.autocommit)
+    self.assertEqual(raw.get_transaction_status(), 0)
+
+  def test_health_check_replaces_dead_connection(self):
+    """ Ensures a connection the server has dropped while it sat in the
+    pool is replaced, rather than failing the next request. """
+    wrapper = self.wrapper()
+    pid = self.backend_pid(wrapper)
+    wrapper.close()
+    with connection.cursor() as cursor:
+      cursor.execute("SELECT pg_terminate_backend(%s)", [pid])
+    self.assertNotEqual(self.backend_pid(wrapper), pid)
+    self.assertEqual(wrapper.pool.stats()["connections_closed"], 1)
+
+  def test_health_check_between_requests(self):
+    """ Ensures a persistent connection is checked once per request. """
+    wrapper = self.wrapper(conn_max_age=None, MAX_SIZE=0)
+    pid = self.backend_pid(wrapper)
+    with connection.cursor() as cursor:
+      cursor.execute("SELECT pg_terminate_backend(%s)", [pid])
+    wrapper.close_if_unusable_or_obsolete()
+    self.assertNotEqual(self.backend_pid(wrapper), pid)
+
+  def test_limit(self):
+    """ Ensures a second connection from the same process waits for the
+    first, and gives up after TIMEOUT. """
+    first, second = self.wrapper(), self.wrapper()
+    self.backend_pid(first)
+    with self.assertRaises(PoolTimeout):
+      second.ensure_connection()
+    first.close()
+    self.backend_pid(second)
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from config.db import router
+from {{ cookiecutter.project_name }}.users.models import User
+
+
+@override_settings(
+  DATABASE_ROUTERS=['config.db.router.PrimaryReplicaRouter'],
+  DATABASE_REPLICAS=['replica'],
+  MIDDLEWARE=['config.db.router.ReplicaStickinessMiddleware'] + settings.MIDDLEWARE,
+)
+class ReplicaRouterTest(TestCase):
+  """ The replica test database is separate and only gets what a test copies
+  into it, which makes it a replica that lags behind the primary. """
+  databases = {"default", "replica"}
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.user = User.objects.create_user(username="anon", email="anon@test.com", first_name="old", password="pw")
+    User.objects.using("replica").bulk_create([User.objects.get(pk=cls.user.pk)])
+    cls.url = reverse('user:detail', kwargs={"username": cls.user})
+
+  def setUp(self):
+    cache.clear()
+    router.reset()
+    self.addCleanup(router.reset)
+
+  def test_reads_go_to_the_replica(self):
+    """ Ensures a client that has not written reads the (stale) replica. """
+    User.objects.filter(pk=self.user.pk).update(first_name="new")
+    cache.clear()
+    response = self.client.get(self.url)
+    self.assertContains(response, "first name:</strong> old")
+    self.assertNotIn(router.STICKY_COOKIE, response.cookies)
+
+  def test_writes_go_to_the_primary(self):
+    self.assertEqual(User.objects.all().db, "replica")
+    User.objects.filter(pk=self.user.pk).update(first_name="new")
+    self.assertEqual(User.objects.using("default").get(pk=self.user.pk).first_name, "new")
+    self.assertEqual(User.objects.using("replica").get(pk=self.user.pk).first_name, "old")
+    # The rest of this thread reads what it wrote.
+    self.assertEqual(User.objects.all().db, "default")
+
+  def test_read_your_writes_after_update(self):
+    """ Ensures a user sees their updated profile right after updating it,
+    even though the replica has not caught up. """
+    response = self.client.post(reverse('user:login'), {"username": "anon", "password": "pw"})
+    self.assertEqual(response.cookies[router.STICKY_COOKIE]['max-age'], settings.REPLICA_STICKY_SECONDS)
+
+    self.client.post(reverse('user:update_account', kwargs={"username": self.user}), {
+      "first_name": "new",
+      "last_name": "nymous",
+      "email": "anon@test.com",
+    })
+    response = self.client.get(self.url)
+    self.assertContains(response, "first name:</strong> new")
+    self.assertEqual(User.objects.using("replica").get(pk=self.user.pk).first_name, "old")
+
+  def test_changed_profile_is_not_cached_from_the_replica(self):
+    """ Ensures other visitors don't get a stale profile cached right after
+    it changed. """
+    user = User.objects.get(pk=self.user.pk)
+    user.first_name = "new"
+    with self.captureOnCommitCallbacks(execute=True):
+      user.save()
+    response = self.client.get(self.url)
+    self.assertContains(response, "first name:</strong> new")
+
+  def test_logged_in_user_from_the_primary(self):
+    """ Ensures a soft deleted user read from a lagging replica isn't put
+    back in the cache, which would keep their other sessions working. """
+    other = self.client_class()
+    other.force_login(self.user)
+    Session.objects.using("replica").bulk_create([Session.objects.get(session_key=other.session.session_key)])
+    User.objects.filter(pk=self.user.pk).update(is_active=False)
+    cache.clear()
+    router.reset()
+    response = other.get(reverse('user:redirect'))
+    self.assertFalse(response.wsgi_request.user.is_authenticated)
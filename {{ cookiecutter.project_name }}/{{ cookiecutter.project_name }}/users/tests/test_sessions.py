@@ -0,0 +1,62 @@
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from config.sessions import SessionStore
+from {{ cookiecutter.project_name }}.users.models import User
+
+
+@override_settings(SESSION_ENGINE='config.sessions', SESSION_DB_WRITE_INTERVAL=60)
+class WriteBehindSessionTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.user = User.objects.create_user(username="anon", email="anon@test.com")
+
+  def setUp(self):
+    cache.clear()
+    self.addCleanup(cache.clear)
+
+  def stored(self, session_key):
+    return SessionStore().decode(Session.objects.get(session_key=session_key).session_data)
+
+  def test_login_survives_cache_flush(self):
+    """ Ensures the login reaches the database even though creating the
+    session wrote it there moments before. """
+    self.client.force_login(self.user)
+    session_key = self.client.session.session_key
+    self.assertEqual(self.stored(session_key)[SESSION_KEY], str(self.user.pk))
+
+    cache.clear()
+    response = self.client.get(reverse('user:update_account', kwargs={"username": self.user}))
+    self.assertEqual(response.status_code, 200)
+
+  def test_changes_written_behind(self):
+    """ Ensures other changes only reach the database once per interval. """
+    session = SessionStore()
+    session["a"] = 1
+    session.create()
+    session["a"] = 2
+    session.save()
+    self.assertEqual(self.stored(session.session_key)["a"], 2)
+
+    session = SessionStore(session.session_key)
+    session["a"] = 3
+    session.save()
+    self.assertEqual(self.stored(session.session_key)["a"], 2)
+    self.assertEqual(SessionStore(session.session_key)["a"], 3)
+
+    cache.delete(session.written_key)
+    session["a"] = 4
+    session.save()
+    self.assertEqual(self.stored(session.session_key)["a"], 4)
+
+  def test_auth_change_written_through(self):
+    session = SessionStore()
+    session.create()
+    session.save()
+    session = SessionStore(session.session_key)
+    session[SESSION_KEY] = str(self.user.pk)
+    session.save()
+    self.assertEqual(self.stored(session.session_key)[SESSION_KEY], str(self.user.pk))
@@ -0,0 +1,87 @@
+import gzip
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import skipIf
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from config.staticfiles import IMMUTABLE_MAX_AGE, MUTABLE_MAX_AGE, StaticFilesMiddleware, brotli
+
+CSS = b"body { color: #333; }\n" * 200
+
+
+class StaticFilesTest(SimpleTestCase):
+  """ Runs collectstatic on a scratch directory, then serves the result. """
+
+  def setUp(self):
+    source, root = Path(tempfile.mkdtemp()), Path(tempfile.mkdtemp())
+    self.addCleanup(shutil.rmtree, source)
+    self.addCleanup(shutil.rmtree, root)
+    (source / "css").mkdir()
+    (source / "css" / "site.css").write_bytes(CSS)
+    (source / "robots.txt").write_bytes(b"User-agent: *\n")
+    settings = override_settings(
+      STATIC_ROOT=str(root),
+      STATICFILES_DIRS=[str(source)],
+      STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+      STATICFILES_STORAGE='config.staticfiles.CompressedManifestStaticFilesStorage',
+    )
+    settings.enable()
+    self.addCleanup(settings.disable)
+    call_command("collectstatic", interactive=False, verbosity=0)
+    self.root = root
+    self.hashed = staticfiles_storage.stored_name("css/site.css")
+    self.middleware = StaticFilesMiddleware(lambda request: HttpResponse("app"))
+
+  def get(self, path, **headers):
+    return self.middleware(RequestFactory().get(path, **headers))
+
+  def test_precompressed_variants(self):
+    """ Ensures compressible files get a .gz (and .br) next to the
+    original and the hashed copy, unless compression doesn't pay. """
+    for name in ("css/site.css", self.hashed):
+      self.assertEqual(gzip.decompress((self.root / (name + ".gz")).read_bytes()), CSS)
+      self.assertEqual((self.root / (name + ".br")).exists(), brotli is not None)
+    self.assertFalse((self.root / "robots.txt.gz").exists())
+
+  def test_accept_encoding(self):
+    """ Ensures the smallest variant the client accepts is served, and
+    that caches know the response depends on Accept-Encoding. """
+    url = "/static/" + self.hashed
+    response = self.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+    self.assertEqual(response["Content-Encoding"], "gzip")
+    self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), CSS)
+    self.assertEqual(response["Vary"], "Accept-Encoding")
+    self.assertEqual(response["Content-Type"], "text/css")
+
+    response = self.get(url, HTTP_ACCEPT_ENCODING="gzip;q=0, identity")
+    self.assertFalse(response.has_header("Content-Encoding"))
+    self.assertEqual(b"".join(response.streaming_content), CSS)
+    self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    response = self.get("/static/robots.txt", HTTP_ACCEPT_ENCODING="gzip")
+    self.assertFalse(response.has_header("Content-Encoding"))
+    self.assertFalse(response.has_header("Vary"))
+
+  @skipIf(brotli is None, "brotli isn't installed")
+  def test_prefers_brotli(self):
+    response = self.get("/static/" + self.hashed, HTTP_ACCEPT_ENCODING="gzip, br")
+    self.assertEqual(response["Content-Encoding"], "br")
+    self.assertEqual(brotli.decompress(b"".join(response.streaming_content)), CSS)
+
+  def test_cache_headers(self):
+    """ Ensures only hashed names, whose content never changes, are cached
+    for good. """
+    response = self.get("/static/" + self.hashed)
+    self.assertEqual(response["Cache-Control"], "public, max-age=%s, immutable" % IMMUTABLE_MAX_AGE)
+    response = self.get("/static/css/site.css")
+    self.assertEqual(response["Cache-Control"], "public, max-age=%s" % MUTABLE_MAX_AGE)
+    response = self.get("/static/css/site.css", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+    self.assertEqual(response.status_code, 304)
+
+  def test_passes_through(self):
+    self.assertEqual(self.get("/static/missing.css").content, b"app")
+    response = self.middleware(RequestFactory().post("/static/" + self.hashed))
+    self.assertEqual(response.content, b"app")
@@ -1,6 +1,19 @@
-from django.test import TestCase, Client
+import json
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from {{ cookiecutter.project_name }}.users.hashers import TunedArgon2PasswordHasher
+from {{ cookiecutter.project_name }}.users.tests.budget import query_budget
 from {{ cookiecutter.project_name }}.users.models import User
+from {{ cookiecutter.project_name }}.users.views import AsyncUserDetailView, AsyncUserRedirectView
 
 
 class CreateViewTest(TestCase):
@@ -32,14 +45,15 @@ class CreateViewTest(TestCase):
 
   def test_POST_and_success_url(self):
     """ Ensures that a user can be created and automatically logged in. """
-    response = self.client.post(self.url, {
-      'username': 'test',
-      'first_name': 'anon',
-      'last_name': 'nymous',
-      'email': 'test@test.com',
-      'password1': 'pw',
-      'password2': 'pw',
-    })
+    with query_budget("user:register POST"):
+      response = self.client.post(self.url, {
+        'username': 'test',
+        'first_name': 'anon',
+        'last_name': 'nymous',
+        'email': 'test@test.com',
+        'password1': 'pw',
+        'password2': 'pw',
+      })
     self.assertTrue(User.objects.filter(username="test").exists())
     self.assertRedirects(
       response, 
@@ -47,6 +61,39 @@ class CreateViewTest(TestCase):
       status_code=302,
       target_status_code=200
     )
+
+  def test_POST_hashes_password_once(self):
+    """ Ensures registering hashes the password once and logs the user in
+    without verifying it again. """
+    hasher = TunedArgon2PasswordHasher
+    with mock.patch.object(hasher, 'encode', autospec=True, side_effect=hasher.encode) as encode, \
+         mock.patch.object(hasher, 'verify', autospec=True, side_effect=hasher.verify) as verify:
+      self.client.post(self.url, {
+        'username': 'test',
+        'first_name': 'anon',
+        'last_name': 'nymous',
+        'email': 'test@test.com',
+        'password1': 'pw',
+        'password2': 'pw',
+      })
+    self.assertEqual(encode.call_count, 1)
+    self.assertEqual(verify.call_count, 0)
+    self.assertEqual(int(self.client.session['_auth_user_id']), User.objects.get(username='test').pk)
+
+  def test_POST_taken_username(self):
+    """ Ensures the form is re-rendered with a field error, and no user is
+    logged in, if the username is already taken. """
+    response = self.client.post(self.url, {
+      'username': 'ANON',
+      'first_name': 'anon',
+      'last_name': 'nymous',
+      'email': 'test@test.com',
+      'password1': 'pw',
+      'password2': 'pw',
+    })
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.context['form']['username'].errors, ['Username has already been taken.'])
+    self.assertNotIn('_auth_user_id', self.client.session)
   
 
 class DetailViewTest(TestCase):
@@ -60,10 +107,65 @@ class DetailViewTest(TestCase):
   def test_GET_active_user(self):
     """ Ensures a 200 is returned and that the right template is rendered
     when requesting to view the detail page of an active user. """
-    response = self.client.get(self.url)
+    cache.clear()
+    with query_budget("user:detail GET"):
+      response = self.client.get(self.url)
     self.assertEqual(response.status_code, 200)
     self.assertTemplateUsed(response, 'users/detail.html')
 
+  def test_GET_own_page(self):
+    """ Ensures the owner's links are shown on their own page, within the
+    query budget for a logged in user. """
+    cache.clear()
+    self.client.force_login(self.user)
+    with query_budget("user:detail GET logged in"):
+      response = self.client.get(self.url)
+    self.assertContains(response, 'update account')
+
+  def test_GET_logged_in_user_from_cache(self):
+    """ Ensures the logged in user is read from the cache after the first
+    request, and read again once it changes. """
+    self.client.force_login(self.user)
+    self.client.get(self.url)
+    with query_budget("user:detail GET logged in, cached") as queries:
+      response = self.client.get(self.url)
+    self.assertEqual(response.status_code, 200)
+    self.assertFalse(any('"users_user"' in query["sql"] for query in queries.captured_queries))
+
+    user = User.objects.get(pk=self.user.pk)
+    user.username = "renamed"
+    user.save()
+    response = self.client.get(reverse('user:detail', kwargs={"username": "renamed"}))
+    self.assertContains(response, 'update account')
+
+  def test_GET_not_modified(self):
+    """ Ensures a client with the current version gets a 304 from the
+    cached profile, without a query or rendering the template. """
+    cache.clear()
+    response = self.client.get(self.url)
+    self.assertEqual(response["Cache-Control"], "private, no-cache")
+    etag, last_modified = response["ETag"], response["Last-Modified"]
+
+    with self.assertNumQueries(0):
+      response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 304)
+    self.assertTemplateNotUsed(response, 'users/detail.html')
+    response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+    self.assertEqual(response.status_code, 304)
+
+    # Someone else sees a different page.
+    self.client.force_login(self.user)
+    self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+    self.client.logout()
+
+    user = User.objects.get(pk=self.user.pk)
+    user.first_name = "changed"
+    with self.captureOnCommitCallbacks(execute=True):
+      user.save()
+    response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+    self.assertContains(response, "changed")
+    self.assertNotEqual(response["ETag"], etag)
+
   def test_GET_inactive_user(self):
     """ Ensures a 404 is raised when requesting to view the detail page
     of an inactive user. """
@@ -82,6 +184,82 @@ class DetailViewTest(TestCase):
     response = self.client.get(self.url)
     self.assertEqual(response.context['object'], self.user)
 
+  def test_GET_loads_public_columns_only(self):
+    """ Ensures the profile is fetched with a single query that neither
+    loads private columns nor needs a second query for them. """
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+      self.client.get(self.url)
+    self.assertEqual(len(queries), 1)
+    self.assertNotIn('"password"', queries[0]['sql'])
+    self.assertIn('"is_active"', queries[0]['sql'])
+
+
+class DirectoryViewTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    joined = timezone.now()
+    # Two users joined at the same time, to page through the tie on id.
+    User.objects.bulk_create([
+      User(username="user%s" % i, email="user%s@test.com" % i, date_joined=joined + timedelta(seconds=i // 2))
+      for i in range(5)
+    ])
+    User.objects.create_user(username="inactive", email="inactive@test.com", is_active=False)
+    cls.user = User.objects.get(username="user0")
+    cls.url = reverse('user:directory')
+
+  def setUp(self):
+    cache.clear()
+    self.client.force_login(self.user)
+
+  def test_unauthorized_GET(self):
+    """ Ensures anonymous clients are sent to the login page, since
+    profiles include email addresses. """
+    self.client.logout()
+    for params in ({}, {"format": "ndjson"}):
+      response = self.client.get(self.url, params)
+      self.assertEqual(response.status_code, 302)
+      self.assertTrue(response["Location"].startswith(reverse('user:login')))
+
+  def test_GET_pages(self):
+    """ Ensures every active user is listed once, in join order, with only
+    their public fields, one query per page besides the session. """
+    self.client.get(self.url)
+    usernames, url = [], self.url + "?limit=2"
+    while url:
+      with query_budget("user:directory GET logged in"):
+        response = self.client.get(url)
+      page = response.json()
+      usernames += [user["username"] for user in page["results"]]
+      url = page["next"]
+    self.assertEqual(usernames, ["user0", "user1", "user2", "user3", "user4"])
+    self.assertEqual(set(page["results"][0]), {"id", "username", "first_name", "last_name", "email", "avatar"})
+
+  def test_GET_invalid_cursor(self):
+    for cursor in ("nope", "WyJ4IiwgMV0=", "bnVsbA=="):
+      response = self.client.get(self.url, {"cursor": cursor})
+      self.assertEqual(response.status_code, 400)
+
+  def test_GET_ndjson(self):
+    """ Ensures the export streams one JSON object per line. """
+    response = self.client.get(self.url, {"format": "ndjson"})
+    self.assertTrue(response.streaming)
+    self.assertEqual(response["Content-Type"], "application/x-ndjson")
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    self.assertEqual([json.loads(line)["username"] for line in lines], ["user0", "user1", "user2", "user3", "user4"])
+
+  @override_settings(DIRECTORY_EXPORT_BURST=2, DIRECTORY_EXPORT_PER_MINUTE=1)
+  def test_GET_ndjson_throttled(self):
+    """ Ensures each user can only start a few exports in a row, while
+    pages stay available. """
+    for _ in range(2):
+      self.assertEqual(self.client.get(self.url, {"format": "ndjson"}).status_code, 200)
+    response = self.client.get(self.url, {"format": "ndjson"})
+    self.assertEqual(response.status_code, 429)
+    self.assertEqual(response["Retry-After"], "60")
+    self.assertEqual(self.client.get(self.url).status_code, 200)
+
 
 class LoginViewTest(TestCase):
 
@@ -111,6 +289,71 @@ class LoginViewTest(TestCase):
     )
 
 
+  def test_POST_upgrades_password_hash(self):
+    """ Ensures a password stored with an older hasher is re-hashed with
+    the preferred one on login. """
+    user = User.objects.create_user(username="legacy", email="legacy@test.com")
+    user.password = make_password('pw', hasher='pbkdf2_sha256')
+    user.save()
+    self.client.post(self.url, {'username': 'legacy', 'password': 'pw'})
+    user.refresh_from_db()
+    self.assertTrue(user.password.startswith('argon2$'))
+
+  @override_settings(LOGIN_THROTTLE_USERNAME_BURST=2, LOGIN_THROTTLE_USERNAME_PER_MINUTE=1)
+  def test_POST_throttled_per_username(self):
+    """ Ensures attempts over the username's rate get a 429 without any
+    password being hashed, while other usernames can still log in. """
+    cache.clear()
+    self.addCleanup(cache.clear)
+    for _ in range(2):
+      response = self.client.post(self.url, {'username': 'anon', 'password': 'wrong'})
+      self.assertEqual(response.status_code, 200)
+
+    hasher = TunedArgon2PasswordHasher
+    with mock.patch.object(hasher, 'encode', autospec=True, side_effect=hasher.encode) as encode, \
+         mock.patch.object(hasher, 'verify', autospec=True, side_effect=hasher.verify) as verify:
+      response = self.client.post(self.url, {'username': 'ANON', 'password': 'wrong'})
+    self.assertEqual(response.status_code, 429)
+    self.assertTrue(55 <= int(response['Retry-After']) <= 60)
+    self.assertEqual(encode.call_count + verify.call_count, 0)
+
+    response = self.client.post(self.url, {'username': 'other', 'password': 'wrong'})
+    self.assertEqual(response.status_code, 200)
+
+  @override_settings(LOGIN_THROTTLE_IP_BURST=2, LOGIN_THROTTLE_IP_PER_MINUTE=6)
+  def test_POST_throttled_per_ip(self):
+    cache.clear()
+    self.addCleanup(cache.clear)
+    for username in ('a', 'b'):
+      self.client.post(self.url, {'username': username, 'password': 'wrong'})
+    response = self.client.post(self.url, {'username': 'c', 'password': 'wrong'})
+    self.assertEqual(response.status_code, 429)
+    self.assertEqual(response['Retry-After'], '10')
+    other = Client(REMOTE_ADDR='192.0.2.1')
+    self.assertEqual(other.post(self.url, {'username': 'c', 'password': 'wrong'}).status_code, 200)
+
+  @override_settings(
+    LOGIN_THROTTLE_IP_BURST=2, LOGIN_THROTTLE_IP_PER_MINUTE=6, TRUSTED_PROXIES=['10.0.0.1'],
+  )
+  def test_POST_throttled_per_ip_behind_proxy(self):
+    """ Ensures clients behind a trusted proxy get a bucket each, and that
+    others can't dodge theirs by sending X-Forwarded-For. """
+    cache.clear()
+    self.addCleanup(cache.clear)
+    proxied = Client(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='198.51.100.1')
+    for username in ('a', 'b'):
+      proxied.post(self.url, {'username': username, 'password': 'wrong'})
+    self.assertEqual(proxied.post(self.url, {'username': 'c', 'password': 'wrong'}).status_code, 429)
+    other = Client(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='198.51.100.2')
+    self.assertEqual(other.post(self.url, {'username': 'c', 'password': 'wrong'}).status_code, 200)
+
+    for address in ('198.51.100.3', '198.51.100.4', '198.51.100.5'):
+      response = self.client.post(
+        self.url, {'username': 'd', 'password': 'wrong'}, HTTP_X_FORWARDED_FOR=address,
+      )
+    self.assertEqual(response.status_code, 429)
+
+
 class RedirectViewTest(TestCase):
 
   @classmethod
@@ -141,6 +384,57 @@ class RedirectViewTest(TestCase):
     )
 
 
+class AsyncViewsTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.factory = AsyncRequestFactory()
+    cls.user = User.objects.create_user(username="anon", email="anon@test.com")
+
+  async def test_detail_GET(self):
+    """ Ensures the async detail view renders the same page as the sync one. """
+    request = self.factory.get('/anon/')
+    request.user = AnonymousUser()
+    response = await AsyncUserDetailView.as_view()(request, username="anon")
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.context_data['object'], self.user)
+    self.assertEqual(response.template_name, ['users/detail.html'])
+
+  async def test_detail_GET_not_modified(self):
+    request = self.factory.get('/anon/')
+    request.user = AnonymousUser()
+    response = await AsyncUserDetailView.as_view()(request, username="anon")
+    request = self.factory.get('/anon/', **{'If-None-Match': response['ETag']})
+    request.user = AnonymousUser()
+    response = await AsyncUserDetailView.as_view()(request, username="anon")
+    self.assertEqual(response.status_code, 304)
+
+  async def test_detail_GET_non_existent_user(self):
+    request = self.factory.get('/sdf/')
+    request.user = AnonymousUser()
+    with self.assertRaises(Http404):
+      await AsyncUserDetailView.as_view()(request, username="sdf")
+
+  async def test_detail_POST_not_allowed(self):
+    request = self.factory.post('/anon/')
+    request.user = AnonymousUser()
+    response = await AsyncUserDetailView.as_view()(request, username="anon")
+    self.assertEqual(response.status_code, 405)
+
+  async def test_redirect_GET(self):
+    """ Ensures logged in users are sent to their detail page and everyone
+    else to the login page. """
+    request = self.factory.get('/~redirect/')
+    request.user = self.user
+    response = await AsyncUserRedirectView.as_view()(request)
+    self.assertEqual(response.url, reverse('user:detail', kwargs={"username": self.user}))
+
+    request = self.factory.get('/~redirect/')
+    request.user = AnonymousUser()
+    response = await AsyncUserRedirectView.as_view()(request)
+    self.assertEqual(response.url, reverse('user:login') + '?next=/~redirect/')
+
+
 class UpdateViewTest(TestCase):
 
   @classmethod
@@ -164,7 +458,8 @@ class UpdateViewTest(TestCase):
     """ Ensures a 200 is returned and that the right template is rendered
     if an authorized user with permission request to view the update page. """
     self.client.force_login(self.user)
-    response = self.client.get(self.url)
+    with query_budget("user:update_account GET"):
+      response = self.client.get(self.url)
     self.assertEqual(response.status_code, 200)
     self.assertTemplateUsed(response, 'users/update.html')
 
@@ -187,11 +482,12 @@ class UpdateViewTest(TestCase):
     """ Ensures a 302 redirect to the detail page is performed if user is
     successfully updated with valid POST data. """
     self.client.force_login(self.user)
-    response = self.client.post(self.url, {
-      "first_name": "test",
-      "last_name": "nymous",
-      "email": "anon@test.com",
-    })
+    with query_budget("user:update_account POST"):
+      response = self.client.post(self.url, {
+        "first_name": "test",
+        "last_name": "nymous",
+        "email": "anon@test.com",
+      })
     self.user.refresh_from_db()
     self.assertRedirects(
       response, 
@@ -201,6 +497,21 @@ class UpdateViewTest(TestCase):
     )
     self.assertEqual(self.user.first_name, 'test')
 
+  def test_POST_taken_email(self):
+    """ Ensures the form is re-rendered with a field error if the email
+    belongs to another user. """
+    User.objects.create_user(username="anon2", email="anon2@test.com")
+    self.client.force_login(self.user)
+    response = self.client.post(self.url, {
+      "first_name": "test",
+      "last_name": "nymous",
+      "email": "anon2@test.com",
+    })
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.context['form']['email'].errors, ['Email has already been taken.'])
+    self.user.refresh_from_db()
+    self.assertEqual(self.user.email, 'anon@test.com')
+
 
 class DeleteViewTest(TestCase):
 
@@ -232,8 +543,10 @@ class DeleteViewTest(TestCase):
       status_code=302,
       target_status_code=200
     )
+    updated_at = self.user.updated_at
     self.user.refresh_from_db()
     self.assertFalse(self.user.is_active)
+    self.assertGreater(self.user.updated_at, updated_at)
 
   def test_GET_without_permission(self):
     """ Ensures a 403 is raised if an authorized user without permission
@@ -298,3 +611,13 @@ class PasswordChangeViewTest(TestCase):
       status_code=302,
       target_status_code=200
     )
+
+  @override_settings(LOGIN_THROTTLE_USERNAME_BURST=1)
+  def test_POST_throttled(self):
+    """ Ensures guessing the old password is throttled like logging in. """
+    cache.clear()
+    self.addCleanup(cache.clear)
+    self.client.force_login(self.user)
+    data = {'old_password': 'wrong', 'new_password1': 'newpw', 'new_password2': 'newpw'}
+    self.assertEqual(self.client.post(self.url, data).status_code, 200)
+    self.assertEqual(self.client.post(self.url, data).status_code, 429)
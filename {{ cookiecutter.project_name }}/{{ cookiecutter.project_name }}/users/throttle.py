@@ -0,0 +1,63 @@
+"""
+Token buckets in front of password checks. Each client IP (see
+config/clientip.py for clients behind a proxy) and each username gets a
+bucket of LOGIN_THROTTLE_*_BURST attempts that refills at
+LOGIN_THROTTLE_*_PER_MINUTE; an attempt with an empty bucket is turned
+away before any password is hashed.
+
+Buckets live in the default cache, so every process shares them. Updates
+are not atomic, so concurrent attempts may occasionally both take the last
+token; the rate still holds within a few attempts.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from config.clientip import client_ip
+
+BUCKET_KEY = "users:throttle:{}:{}"
+
+
+def take_token(scope, ident, burst, per_minute):
+    """
+    Take one token from the bucket for ident. Returns 0 if there was one,
+    otherwise the seconds until there will be. A burst or rate of 0
+    disables the bucket.
+    """
+    if not burst or not per_minute:
+        return 0
+    key = BUCKET_KEY.format(scope, hashlib.sha256(ident.encode()).hexdigest())
+    rate = per_minute / 60
+    now = time.time()
+    tokens, updated = cache.get(key, (burst, now))
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < 1:
+        return (1 - tokens) / rate
+    # A bucket left alone until it is full again is the same as no bucket.
+    cache.set(key, (tokens - 1, now), math.ceil(burst / rate))
+    return 0
+
+
+def check_login(request, username):
+    """ Seconds the client has to wait before it may check a password for
+    username, or 0 if it may go ahead. """
+    wait = take_token(
+        "ip", client_ip(request),
+        settings.LOGIN_THROTTLE_IP_BURST, settings.LOGIN_THROTTLE_IP_PER_MINUTE,
+    )
+    if wait:
+        return wait
+    return take_token(
+        "username", username.lower(),
+        settings.LOGIN_THROTTLE_USERNAME_BURST, settings.LOGIN_THROTTLE_USERNAME_PER_MINUTE,
+    )
+
+
+def too_many_attempts(wait):
+    """ A plain 429; rendering a template here would cost what the throttle saves. """
+    response = HttpResponse("Too many attempts, try again later.", status=429, content_type="text/plain")
+    response["Retry-After"] = str(math.ceil(wait))
+    return response
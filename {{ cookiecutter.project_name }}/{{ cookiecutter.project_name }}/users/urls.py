@@ -1,16 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth.views import LogoutView
 from . import views
 
 app_name = "user"
 
+if settings.ASYNC_VIEWS:
+  UserRedirectView, UserDetailView = views.AsyncUserRedirectView, views.AsyncUserDetailView
+else:
+  UserRedirectView, UserDetailView = views.UserRedirectView, views.UserDetailView
+
 urlpatterns = [
   path('register/', views.UserCreateView.as_view(), name="register"),
   path('login/', views.UserLoginView.as_view(), name="login"),
   path('logout/', LogoutView.as_view(), name="logout"),
-  path('~redirect/', views.UserRedirectView.as_view(), name="redirect"),
-  path('<username>/', views.UserDetailView.as_view(), name="detail"),
+  path('~redirect/', UserRedirectView.as_view(), name="redirect"),
+  path('~directory/', views.UserDirectoryView.as_view(), name="directory"),
+  path('<username>/', UserDetailView.as_view(), name="detail"),
   path('<username>/update-account/', views.UserUpdateView.as_view(), name="update_account"),
+  path('<username>/avatar/', views.UserAvatarView.as_view(), name="avatar"),
   path('<username>/delete-account/', views.UserDeleteView.as_view(), name="delete_account"),
   path('<username>/change-password/', views.UserPasswordChangeView.as_view(), name="password_change"),
 ]
@@ -1,9 +1,23 @@
-from django.contrib.auth import authenticate, get_user_model, login
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import math
+from functools import update_wrapper
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model, login
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.contrib.auth.views import LoginView, LogoutView, PasswordChangeView
+from django.contrib.auth.views import LoginView, LogoutView, PasswordChangeView, redirect_to_login
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponseRedirect, Http404
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.http import HttpResponseRedirect, Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.views.generic import (
@@ -12,9 +26,20 @@ from django.views.generic import (
     DetailView,
     FormView,
     RedirectView,
+    TemplateView,
     UpdateView,
+    View,
 )
-from .forms import CreateUserForm, UpdateUserForm
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from .avatars import AvatarUploadHandler, avatar_url, save_avatar
+from .cache import get_profile
+from .forms import AvatarForm, CreateUserForm, UpdateUserForm
+from .models import PUBLIC_PROFILE_FIELDS
+from .throttle import check_login, take_token, too_many_attempts
 
 User = get_user_model()
 
@@ -33,6 +58,54 @@ class PermissionMixin(UserPassesTestMixin):
             return True
 
 
+class LoginThrottleMixin:
+    """
+  Mixin for views that check a password on POST. Attempts over the rates
+  in users/throttle.py get a 429 before the form hashes anything.
+  """
+
+    def get_throttle_username(self):
+        return self.request.POST.get("username", "")
+
+    def post(self, request, *args, **kwargs):
+        wait = check_login(request, self.get_throttle_username())
+        if wait:
+            return too_many_attempts(wait)
+        return super().post(request, *args, **kwargs)
+
+
+class AsyncViewMixin:
+    """
+  Mixin for class-based views with async handlers (async def get). Django
+  only runs a view on the event loop if the view function itself is a
+  coroutine function, so as_view() returns one.
+  """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            # Sync handlers such as http_method_not_allowed return a response.
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        return update_wrapper(async_view, view)
+
+
+def is_authenticated(request):
+    """ request.user is loaded lazily from the session and the database,
+    so call this through sync_to_async in async views. """
+    return request.user.is_authenticated
+
+
+class AsyncTemplateView(AsyncViewMixin, TemplateView):
+    async def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
 class UserCreateView(CreateView):
     template_name = "registration/register.html"
     form_class = CreateUserForm
@@ -45,11 +118,11 @@ class UserCreateView(CreateView):
             return super().get(request, *args, **kwargs)
 
     def form_valid(self, form):
-        """ Login user after account is created. """
-        form.save()
-        username = self.request.POST["username"]
-        password = self.request.POST["password2"]
-        user = authenticate(self.request, username=username, password=password)
+        """ Login user after account is created. The user was just saved with
+        the password it was given, so authenticate() would only hash it twice. """
+        user = form.save()
+        if user is None:
+            return self.form_invalid(form)
         login(self.request, user)
         return HttpResponseRedirect(self.get_success_url())
 
@@ -61,23 +134,145 @@ class UserDetailView(DetailView):
     template_name = "users/detail.html"
 
     def get(self, request, *args, **kwargs):
-        """ Only show profile if user is active. """
-        user = self.get_object()
-        if user.is_active:
-            return super().get(request, *args, **kwargs)
-        else:
-            raise Http404("User does not exist!")
+        self.object = self.get_object()
+        etag, last_modified = self.get_validators()
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return add_validators(response, etag, last_modified)
 
     def get_object(self, queryset=None):
-        """ Prevent duplicate queries when retrieving object in other methods. """
+        """ Prevent duplicate queries when retrieving object in other methods.
+        Profiles of active users are read through the cache, see users/cache.py. """
         if not hasattr(self, "object"):
-            username = self.kwargs["username"]
-            user = get_object_or_404(User, username=username)
+            user = get_profile(self.kwargs["username"])
+            if user is None:
+                raise Http404("User does not exist!")
             self.object = user
         return self.object
 
+    def get_validators(self):
+        """
+        ETag and Last-Modified for the page, from the cached profile's
+        updated_at and who is looking, since the page shows that too.
+        Returns (None, None) while there are messages to show.
+        """
+        if len(messages.get_messages(self.request)):
+            return None, None
+        user = self.request.user
+        version = "%s:%s:%s" % (self.object.updated_at.timestamp(), user.pk, user.username)
+        etag = quote_etag(hashlib.md5(version.encode()).hexdigest())
+        return etag, int(self.object.updated_at.timestamp())
+
 
-class UserLoginView(LoginView):
+class AsyncUserDetailView(AsyncViewMixin, UserDetailView):
+    """ Frees the event loop while the profile is read from the cache or
+    the database. The template is rendered by Django in a worker thread. """
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await sync_to_async(self.get_object)()
+        etag, last_modified = await sync_to_async(self.get_validators)()
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            context = self.get_context_data(object=self.object)
+            response = self.render_to_response(context)
+        return add_validators(response, etag, last_modified)
+
+
+def add_validators(response, etag, last_modified):
+    """ Make browsers revalidate the page each time, which is cheap now. """
+    if etag is not None:
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+
+class UserDirectoryView(LoginRequiredMixin, View):
+    """
+  Active users' public profiles in join order, for logged in users only
+  since profiles include email addresses. Pages are JSON,
+  {"results": [...], "next": url}, where next continues after the last
+  user with ?cursor=; they are found through the (date_joined, id) index
+  without OFFSET, so every page costs the same. ?format=ndjson streams
+  every user from the cursor on, one JSON object per line, fetching
+  STREAM_CHUNK_SIZE rows at a time. Each user may start
+  DIRECTORY_EXPORT_BURST exports, refilled at DIRECTORY_EXPORT_PER_MINUTE.
+  """
+    PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 1000
+    STREAM_CHUNK_SIZE = 2000
+
+    def get(self, request, *args, **kwargs):
+        queryset = User.active.order_by("date_joined", "id").values(*PUBLIC_PROFILE_FIELDS, "date_joined")
+        cursor = request.GET.get("cursor")
+        if cursor:
+            try:
+                date_joined, pk = decode_cursor(cursor)
+            except ValueError:
+                return JsonResponse({"error": "Invalid cursor."}, status=400)
+            # The first condition lets the index seek to date_joined.
+            queryset = queryset.filter(
+                Q(date_joined__gte=date_joined),
+                Q(date_joined__gt=date_joined) | Q(id__gt=pk),
+            )
+
+        if request.GET.get("format") == "ndjson":
+            wait = take_token(
+                "export", str(request.user.pk),
+                settings.DIRECTORY_EXPORT_BURST, settings.DIRECTORY_EXPORT_PER_MINUTE,
+            )
+            if wait:
+                response = JsonResponse({"error": "Too many exports, try again later."}, status=429)
+                response["Retry-After"] = str(math.ceil(wait))
+                return response
+            rows = queryset.iterator(chunk_size=self.STREAM_CHUNK_SIZE)
+            return StreamingHttpResponse(
+                (json.dumps(public_profile(row), cls=DjangoJSONEncoder) + "\n" for row in rows),
+                content_type="application/x-ndjson",
+            )
+
+        try:
+            limit = max(1, min(int(request.GET.get("limit", self.PAGE_SIZE)), self.MAX_PAGE_SIZE))
+        except ValueError:
+            return JsonResponse({"error": "Invalid limit."}, status=400)
+        rows = list(queryset[:limit + 1])
+        next_url = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_url = "%s?%s" % (request.path, urlencode({
+                "cursor": encode_cursor(rows[-1]["date_joined"], rows[-1]["id"]),
+                "limit": limit,
+            }))
+        return JsonResponse({"results": [public_profile(row) for row in rows], "next": next_url})
+
+
+def public_profile(row):
+    """ The columns users/detail.html shows, without the cursor's date_joined
+    and with the avatar's URL instead of its hash. """
+    profile = {field: row[field] for field in PUBLIC_PROFILE_FIELDS}
+    profile["avatar"] = avatar_url(row["avatar"])
+    return profile
+
+
+def encode_cursor(date_joined, pk):
+    return base64.urlsafe_b64encode(json.dumps([date_joined.isoformat(), pk]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """ Raises ValueError for anything encode_cursor() did not make. """
+    try:
+        date_joined, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        date_joined = parse_datetime(date_joined)
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as error:
+        raise ValueError(error)
+    if date_joined is None or not isinstance(pk, int):
+        raise ValueError(cursor)
+    return date_joined, pk
+
+
+class UserLoginView(LoginThrottleMixin, LoginView):
     template_name = "registration/login.html"
 
     def get(self, request, *args, **kwargs):
@@ -95,28 +290,72 @@ class UserRedirectView(LoginRequiredMixin, RedirectView):
         return reverse("user:detail", kwargs={"username": self.request.user})
 
 
+class AsyncUserRedirectView(AsyncViewMixin, RedirectView):
+    async def get(self, request, *args, **kwargs):
+        if not await sync_to_async(is_authenticated)(request):
+            return redirect_to_login(request.get_full_path())
+        return super().get(request, *args, **kwargs)
+
+    def get_redirect_url(self):
+        return reverse("user:detail", kwargs={"username": self.request.user})
+
+
 class UserUpdateView(LoginRequiredMixin, PermissionMixin, UpdateView):
     template_name = "users/update.html"
     form_class = UpdateUserForm
 
     def get_object(self, queryset=None):
         username = self.kwargs["username"].lower()
-        user = get_object_or_404(User, username=username)
+        user = get_object_or_404(User.active, username=username)
         return user
 
+    def form_valid(self, form):
+        """ Re-render the form if the email was taken in the meantime. """
+        if form.save() is None:
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class UserAvatarView(LoginRequiredMixin, PermissionMixin, FormView):
+    template_name = "users/avatar.html"
+    form_class = AvatarForm
+
+    def post(self, request, *args, **kwargs):
+        """ Upload handlers can only be replaced before the body is read,
+        which CsrfViewMiddleware would do, so the CSRF check runs here. """
+        request.upload_handlers = [AvatarUploadHandler(request)]
+        return csrf_protect(super().post)(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        save_avatar(self.request.user, form.cleaned_data["avatar"])
+        messages.success(self.request, "Your new avatar will show up in a moment.")
+        return HttpResponseRedirect(reverse("user:detail", kwargs={"username": self.request.user}))
+
 
 class UserDeleteView(LoginRequiredMixin, PermissionMixin, DeleteView):
     def get(self, request, *args, **kwargs):
         """ Soft deletion by changing user.is_active to False. """
         username = kwargs["username"]
-        user = get_object_or_404(User, username=username)
+        user = get_object_or_404(User.active.only("id", "username", "is_active"), username=username)
         user.is_active = False
-        user.save()
+        # A deferred auto_now field isn't saved unless it is named.
+        user.save(update_fields=["is_active", "updated_at"])
         messages.success(request, "User has been deleted.")
         return redirect(reverse("index"))
 
 
-class UserPasswordChangeView(LoginRequiredMixin, PermissionMixin, PasswordChangeView):
+class UserPasswordChangeView(LoginRequiredMixin, PermissionMixin, LoginThrottleMixin, PasswordChangeView):
+    def get_throttle_username(self):
+        return self.request.user.username
+
+    def get_form_kwargs(self):
+        """ request.user comes from the cache without its password hash,
+        see users/backends.py. """
+        kwargs = super().get_form_kwargs()
+        kwargs["user"] = User.objects.db_manager(DEFAULT_DB_ALIAS).get(pk=self.request.user.pk)
+        return kwargs
+
     def get_success_url(self):
         messages.success(self.request, "Password has been changed.")
         return reverse("user:detail", kwargs={"username": self.request.user})